@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+'''
+Send events when Statuscake tests change status
+
+The tests listing is polled with ``statuscake.get_all_tests`` and compared
+with the Status (and optionally Uptime) seen at the previous poll. Only the
+tests that changed produce an event, tagged with their TestID and new
+status:
+
+    salt/beacon/<minion>/statuscake/<TestID>/<Status>
+
+Polling is adaptive: every ``down_interval`` seconds while a test is not
+up, every ``up_interval`` seconds once they are all up. The first poll only
+records the current status. Salt's own ``interval`` option would hold the
+beacon back, leave it unset.
+
+.. code-block:: yaml
+
+    beacons:
+      statuscake:
+        - up_interval: 300
+        - down_interval: 30
+        - uptime_delta: 1
+        - tags:
+          - production
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import logging
+import time
+
+# Import 3rd-party libs
+from salt.ext import six
+
+log = logging.getLogger(__name__)
+
+__virtualname__ = 'statuscake'
+
+DEFAULT_UP_INTERVAL = 300
+DEFAULT_DOWN_INTERVAL = 30
+UP = 'Up'
+
+
+def __virtual__():
+    return __virtualname__
+
+
+def _config(config):
+    if isinstance(config, list):
+        merged = {}
+        for item in config:
+            if isinstance(item, dict):
+                merged.update(item)
+        return merged
+    return dict(config or {})
+
+
+def validate(config):
+    '''
+    Validate the beacon configuration
+    '''
+    if not isinstance(config, (list, dict)):
+        return False, 'Configuration for statuscake beacon must be a list or a dict.'
+    config = _config(config)
+    for key in ('up_interval', 'down_interval', 'uptime_delta'):
+        if key in config:
+            try:
+                if float(config[key]) < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return False, 'Configuration {0} for statuscake beacon must be a positive number.'.format(key)
+    if 'tags' in config and not isinstance(config['tags'], (list,) + six.string_types):
+        return False, 'Configuration tags for statuscake beacon must be a list.'
+    return True, 'Valid beacon configuration'
+
+
+def _selected(record, tags):
+    if not tags:
+        return True
+    return bool(tags.intersection(record.get('TestTags') or ()))
+
+
+def beacon(config):
+    '''
+    Poll the tests listing when due and return the status transitions
+    '''
+    config = _config(config)
+    up_interval = float(config.get('up_interval', DEFAULT_UP_INTERVAL))
+    down_interval = float(config.get('down_interval', DEFAULT_DOWN_INTERVAL))
+    uptime_delta = float(config.get('uptime_delta', 0))
+    tags = config.get('tags')
+    if isinstance(tags, six.string_types):
+        tags = tags.split(',')
+    tags = set(tags or ())
+    profile = config.get('profile')
+
+    now = time.time()
+    state = __context__.setdefault('statuscake.beacon', {'next': 0, 'last': None})
+    if now < state['next']:
+        return []
+
+    # The beacon lives as long as the minion, keep it out of the job deadline
+    result = __salt__['statuscake.get_all_tests'](refresh=True, profile=profile, records=True,
+                                                  deadline=False)
+    if not result['res']:
+        log.warning('statuscake beacon unable to list tests: %s', result['message'])
+        state['next'] = now + min(up_interval, down_interval)
+        return []
+
+    last = state['last']
+    current = {}
+    events = []
+    down = False
+    for record in result['data']:
+        if not _selected(record, tags):
+            continue
+        test_id = record['TestID']
+        status = record.get('Status')
+        uptime = record.get('Uptime')
+        if status != UP:
+            down = True
+
+        previous = last.get(test_id) if last is not None else None
+        current[test_id] = (status, uptime)
+        if previous is None:
+            continue
+
+        old_status, old_uptime = previous
+        changed = status != old_status
+        if not changed and uptime_delta and uptime is not None and old_uptime is not None:
+            try:
+                changed = abs(float(uptime) - float(old_uptime)) >= uptime_delta
+            except (TypeError, ValueError):
+                changed = False
+            if not changed:
+                # Compare with the uptime of the last event, not the last poll
+                current[test_id] = (status, old_uptime)
+        if changed:
+            events.append({
+                'tag': '{0}/{1}'.format(test_id, status),
+                'TestID': test_id,
+                'WebsiteName': record.get('WebsiteName'),
+                'WebsiteURL': record.get('WebsiteURL'),
+                'Status': status,
+                'old_Status': old_status,
+                'Uptime': uptime,
+                'old_Uptime': old_uptime,
+            })
+
+    state['last'] = current
+    state['next'] = now + (down_interval if down else up_interval)
+    return events
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the cost of resolving the statuscake credentials per API call
+
+Each authenticated call used to look the credentials up with four
+``config.get`` calls: dotted and nested forms of the api key and of the
+username. They are now resolved once per process into a cached profile.
+Both are timed through Salt's loader, with the credentials nested in a
+pillar padded with ``--pillar-keys`` unrelated entries:
+
+.. code-block:: bash
+
+    python bench/credentials.py --pillar-keys 20000 --calls 5000
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+# Import salt libs
+import salt.config
+import salt.loader
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load(cachedir, pillar_keys):
+    '''
+    Return the execution modules of a minion loader with a large pillar
+    '''
+    pillar = dict(('app{0}'.format(i), {'key': i, 'items': [i, str(i)]})
+                  for i in range(pillar_keys))
+    pillar['statuscake'] = {'username': 'bench', 'api_key': 'bench'}
+    opts = salt.config.DEFAULT_MINION_OPTS.copy()
+    opts.update({
+        'file_client': 'local',
+        'cachedir': cachedir,
+        'module_dirs': [os.path.join(ROOT, 'module')],
+        'pillar': pillar,
+    })
+    utils = salt.loader.utils(opts)
+    return salt.loader.minion_mods(opts, utils=utils)
+
+
+def module_globals(funcs):
+    func = funcs['statuscake.get_test']
+    return getattr(func, 'func', func).__globals__
+
+
+def per_call(func, calls):
+    started = time.time()
+    for _ in range(calls):
+        func()
+    return (time.time() - started) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pillar-keys', type=int, default=20000)
+    parser.add_argument('--calls', type=int, default=5000)
+    args = parser.parse_args()
+
+    cachedir = tempfile.mkdtemp(prefix='statuscake-bench-')
+    try:
+        funcs = load(cachedir, args.pillar_keys)
+        config_get = funcs['config.get']
+        module = module_globals(funcs)
+
+        def lookups():
+            # Resolution made by every call before the cached profiles
+            return ((config_get('statuscake.api_key') or config_get('statuscake:api_key')),
+                    (config_get('statuscake.username') or config_get('statuscake:username')))
+
+        def cached():
+            return (module['_check_api_key'](None)['data'],
+                    module['_check_api_username'](None)['data'])
+
+        assert lookups() == cached() == ('bench', 'bench')
+        print('{0:>10} {1:>12}'.format('lookup', 'us/call'))
+        for name, func in (('config.get', lookups), ('profile', cached)):
+            print('{0:>10} {1:>12.2f}'.format(name, per_call(func, args.calls) * 1e6))
+    finally:
+        shutil.rmtree(cachedir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+'''
+Local stand-in for the StatusCake API
+
+Implements the endpoints used by module/statuscake.py with an in-memory
+account, so the module can be measured without touching StatusCake:
+
+    GET            /API/Tests/
+    GET, DELETE    /API/Tests/Details?TestID=
+    PUT            /API/Tests/Update
+    GET            /API/SSL/ and /API/SSL/?id=
+    PUT, DELETE    /API/SSL/Update
+    GET            /API/ContactGroups
+    PUT, DELETE    /API/ContactGroups/Update
+    GET            /API/Locations/json
+    GET            /API/Tests/Checks?TestID=&Start=&End=&Limit=
+
+Point the module at it with:
+
+.. code-block:: yaml
+
+    statuscake:
+      api_url: http://127.0.0.1:8080
+
+Given a certificate, it answers over HTTPS and ``connections`` counts the
+TLS handshakes:
+
+.. code-block:: python
+
+    FakeStatusCake(tests=100, certfile='cert.pem', keyfile='key.pem')
+
+Run standalone:
+
+.. code-block:: bash
+
+    python bench/fake_statuscake.py --tests 10000 --latency 0.05 --rate-limit 20
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function
+import argparse
+import collections
+import json
+import ssl
+import threading
+import time
+
+# pylint: disable=import-error,no-name-in-module
+from salt.ext.six.moves import BaseHTTPServer
+from salt.ext.six.moves import socketserver
+from salt.ext.six.moves.urllib.parse import urlsplit, parse_qs
+# pylint: enable=import-error,no-name-in-module
+
+
+def make_test(test_id, tags=('bench',)):
+    return {
+        'TestID': test_id,
+        'Paused': False,
+        'TestType': 'HTTP',
+        'WebsiteName': 'site-{0}'.format(test_id),
+        'WebsiteURL': 'https://site-{0}.example.com'.format(test_id),
+        'CheckRate': 300,
+        'ContactGroup': [],
+        'ContactID': 0,
+        'Status': 'Up',
+        'Uptime': 100,
+        'Public': 0,
+        'NormalisedResponse': 0,
+        'TestTags': list(tags),
+    }
+
+
+def make_ssl(ssl_id):
+    return {
+        'id': ssl_id,
+        'domain': 'https://site-{0}.example.com'.format(ssl_id),
+        'checkrate': 3600,
+        'contact_groups': [],
+        'alert_at': '1,7,30',
+        'alert_expiry': True,
+        'alert_reminder': True,
+        'alert_broken': True,
+        'paused': False,
+        'cert_status': 'CERT_OK',
+        'cipher_score': 100,
+        'cert_score': 100,
+    }
+
+
+def make_group(group_id):
+    return {
+        'ContactID': group_id,
+        'GroupName': 'group-{0}'.format(group_id),
+        'DesktopAlert': 0,
+        'Emails': ['ops-{0}@example.com'.format(group_id)],
+        'Mobiles': [],
+        'Boxcar': '',
+        'Pushover': '',
+        'PingURL': '',
+    }
+
+
+LOCATIONS = {
+    '1': {'guid': 'uk1', 'servercode': 'UK1', 'title': 'London 1',
+          'ip': '10.0.0.1', 'ipv6': '', 'countryiso': 'GB', 'region': 'Europe',
+          'status': 'Up'},
+    '2': {'guid': 'us1', 'servercode': 'US1', 'title': 'New York 1',
+          'ip': '10.0.0.2', 'ipv6': '', 'countryiso': 'US', 'region': 'North America',
+          'status': 'Up'},
+}
+
+
+def make_checks(test, start, end, limit):
+    '''
+    Deterministic checks of test between start and end, newest first
+    '''
+    rate = int(test.get('CheckRate') or 300)
+    servers = sorted(location['servercode'] for location in LOCATIONS.values())
+    checks = []
+    tick = int(end) - int(end) % rate
+    while tick >= start and len(checks) < limit:
+        step = tick // rate + int(test['TestID'])
+        down = step % 97 == 0
+        checks.append({
+            'Time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(tick)),
+            'Status': 'Down' if down else 'Up',
+            'Location': servers[step % len(servers)],
+            'Performance': None if down else 80 + (step * 37) % 400,
+            'StatusCode': 500 if down else 200,
+        })
+        tick -= rate
+    return checks
+
+
+class Account(object):
+    '''
+    In-memory StatusCake account
+    '''
+
+    def __init__(self, tests=0, ssls=0, groups=0):
+        self.lock = threading.Lock()
+        self.groups = collections.OrderedDict(
+            (i, make_group(i)) for i in range(1, groups + 1))
+        self.tests = collections.OrderedDict(
+            (i, make_test(i)) for i in range(1, tests + 1))
+        self.ssls = collections.OrderedDict(
+            (i, make_ssl(i)) for i in range(1, ssls + 1))
+        self.next_id = max([tests, ssls, groups]) + 1
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def details(self, test):
+        details = dict(test)
+        details['URI'] = details.pop('WebsiteURL')
+        details['Tags'] = details.pop('TestTags')
+        details['ContactGroups'] = [{'ID': group, 'Name': str(group)}
+                                    for group in details.pop('ContactGroup')]
+        return details
+
+
+class Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send headers and body in one segment, avoiding delayed ACK stalls
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.stand_in.lock:
+            self.server.stand_in.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None, headers=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _form(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        return dict((k, v[-1]) for k, v in parse_qs(raw, keep_blank_values=True).items())
+
+    def _handle(self):
+        stand_in = self.server.stand_in
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/')
+        query = dict((k, v[-1]) for k, v in parse_qs(parts.query).items())
+        stand_in.record(self.command, path)
+
+        if stand_in.latency:
+            time.sleep(stand_in.latency)
+
+        if not stand_in.allow():
+            stand_in.record(self.command, path, limited=True)
+            return self._reply(429, {'ErrNo': 429, 'Error': 'Too many requests'},
+                               {'Retry-After': '1'})
+
+        if path != '/API/Locations/json' and not self.headers.get('API'):
+            return self._reply(200, {'ErrNo': 0, 'Error': 'Can not access account'})
+
+        route = (self.command, path)
+        account = stand_in.account
+        with account.lock:
+            if route == ('GET', '/API/Tests'):
+                return self._reply(200, list(account.tests.values()))
+            if route == ('GET', '/API/Tests/Checks'):
+                test = account.tests.get(int(query.get('TestID', 0)))
+                if test is None:
+                    return self._reply(200, {'ErrNo': 1, 'Error': 'No Test Found'})
+                now = time.time()
+                return self._reply(200, make_checks(
+                    test, float(query.get('Start', now - 86400)),
+                    float(query.get('End', now)), int(query.get('Limit', 1000))))
+            if route == ('GET', '/API/Tests/Details'):
+                test = account.tests.get(int(query.get('TestID', 0)))
+                if test is None:
+                    return self._reply(200, {'ErrNo': 1, 'Error': 'No Test Found'})
+                return self._reply(200, account.details(test))
+            if route == ('DELETE', '/API/Tests/Details'):
+                found = account.tests.pop(int(query.get('TestID', 0)), None)
+                return self._reply(200, {'Success': found is not None,
+                                         'Message': 'Deleted' if found else 'No Test Found'})
+            if route == ('PUT', '/API/Tests/Update'):
+                form = self._form()
+                if form.get('TestID'):
+                    test = account.tests.get(int(form['TestID']))
+                    if test is None:
+                        return self._reply(200, {'Success': False, 'Message': 'No Test Found'})
+                    message = 'Test Updated'
+                    insert_id = test['TestID']
+                else:
+                    insert_id = account.new_id()
+                    test = account.tests[insert_id] = make_test(insert_id, ())
+                    message = 'Test Inserted'
+                for key, value in form.items():
+                    if key in ('TestTags', 'ContactGroup'):
+                        value = [item for item in value.split(',') if item]
+                    if key != 'TestID':
+                        test[key] = value
+                return self._reply(200, {'Success': True, 'Message': message,
+                                         'Issues': {}, 'Data': form,
+                                         'InsertID': insert_id})
+            if route == ('GET', '/API/SSL'):
+                if 'id' in query:
+                    ssl = account.ssls.get(int(query['id']))
+                    return self._reply(200, [ssl] if ssl else [])
+                return self._reply(200, list(account.ssls.values()))
+            if route == ('PUT', '/API/SSL/Update'):
+                form = self._form()
+                if form.get('id'):
+                    ssl = account.ssls.get(int(form['id']))
+                    if ssl is None:
+                        return self._reply(200, {'Success': False, 'Message': 'No SSL Found'})
+                else:
+                    ssl_id = account.new_id()
+                    ssl = account.ssls[ssl_id] = make_ssl(ssl_id)
+                for key, value in form.items():
+                    if key != 'id':
+                        ssl[key] = value
+                return self._reply(200, {'Success': True, 'Message': 'SSL saved',
+                                         'InsertID': ssl['id']})
+            if route == ('DELETE', '/API/SSL/Update'):
+                found = account.ssls.pop(int(query.get('id', 0)), None)
+                return self._reply(200, {'Success': found is not None,
+                                         'Message': 'Deleted' if found else 'No SSL Found'})
+            if route == ('GET', '/API/ContactGroups'):
+                return self._reply(200, list(account.groups.values()))
+            if route == ('PUT', '/API/ContactGroups/Update'):
+                form = self._form()
+                if form.get('ContactID'):
+                    group = account.groups.get(int(form['ContactID']))
+                    if group is None:
+                        return self._reply(200, {'Success': False, 'Message': 'No Group Found'})
+                else:
+                    group_id = account.new_id()
+                    group = account.groups[group_id] = make_group(group_id)
+                    group.update({'Emails': [], 'GroupName': form.get('GroupName')})
+                for key, value in form.items():
+                    if key in ('Email', 'Mobile'):
+                        group[key + 's'] = [item for item in value.split(',') if item]
+                    elif key != 'ContactID':
+                        group[key] = value
+                return self._reply(200, {'Success': True, 'Message': 'Group saved',
+                                         'InsertID': group['ContactID']})
+            if route == ('DELETE', '/API/ContactGroups/Update'):
+                found = account.groups.pop(int(query.get('ContactID', 0)), None)
+                return self._reply(200, {'Success': found is not None,
+                                         'Message': 'Deleted' if found else 'No Group Found'})
+            if route == ('GET', '/API/Locations/json'):
+                return self._reply(200, LOCATIONS)
+
+        return self._reply(404, {'ErrNo': 404, 'Error': 'Unknown endpoint'})
+
+    do_GET = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+    do_POST = _handle
+
+
+class FakeStatusCake(object):
+    '''
+    Threaded local StatusCake stand-in.
+
+    :param tests: Number of tests in the account.
+    :param ssls: Number of SSL tests in the account.
+    :param groups: Number of contact groups in the account.
+    :param latency: Seconds added to every answer.
+    :param rate_limit: Requests per second answered before sending 429, 0 for no limit.
+    :param certfile: PEM certificate to answer over HTTPS instead of HTTP.
+    :param keyfile: PEM private key of certfile, when not in certfile.
+    '''
+
+    def __init__(self, tests=0, ssls=0, latency=0.0, rate_limit=0,
+                 host='127.0.0.1', port=0, groups=0, certfile=None, keyfile=None):
+        self.account = Account(tests, ssls, groups)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.limited = collections.Counter()
+        self.connections = 0
+        self._window = (0, 0)
+        self.httpd = Server((host, port), Handler)
+        self.httpd.stand_in = self
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = 'https'
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return '{0}://{1}:{2}'.format(self.scheme, host, port)
+
+    def record(self, method, path, limited=False):
+        with self.lock:
+            (self.limited if limited else self.calls)[(method, path)] += 1
+
+    def allow(self):
+        if not self.rate_limit:
+            return True
+        with self.lock:
+            second = int(time.time())
+            start, count = self._window
+            if start != second:
+                start, count = second, 0
+            count += 1
+            self._window = (start, count)
+            return count <= self.rate_limit
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+            self.limited.clear()
+            self.connections = 0
+
+    def total_calls(self):
+        with self.lock:
+            return sum(self.calls.values())
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tests', type=int, default=100)
+    parser.add_argument('--ssls', type=int, default=10)
+    parser.add_argument('--groups', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--certfile', help='answer over HTTPS with this PEM certificate')
+    parser.add_argument('--keyfile', help='PEM private key of --certfile')
+    args = parser.parse_args()
+
+    stand_in = FakeStatusCake(args.tests, args.ssls, args.latency,
+                              args.rate_limit, args.host, args.port, args.groups,
+                              args.certfile, args.keyfile)
+    print('Fake StatusCake listening on {0}'.format(stand_in.url))
+    try:
+        stand_in.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(dict(('{0} {1}'.format(*k), v)
+                              for k, v in stand_in.calls.items()), indent=2))
+
+
+if __name__ == '__main__':
+    main()
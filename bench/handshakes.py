@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+'''
+Count the TLS handshakes made by module/statuscake.py
+
+bench/fake_statuscake.py answers over HTTPS with a throwaway self-signed
+certificate, given to the module as ``ca_bundle``. The same calls are made
+with the pooled sessions and with ``pool: False`` (``salt.utils.http``),
+and the handshakes seen by the stand-in are reported for both. With the
+pool, a run should only open as many connections as the concurrency.
+
+.. code-block:: bash
+
+    python bench/handshakes.py --calls 200 --concurrency 4
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_statuscake import FakeStatusCake  # pylint: disable=wrong-import-position
+from run import load  # pylint: disable=wrong-import-position
+
+
+def make_certificate(directory):
+    '''
+    Write a self-signed certificate for 127.0.0.1, return its path
+    '''
+    certfile = os.path.join(directory, 'stand-in.pem')
+    subprocess.check_call(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+         '-subj', '/CN=127.0.0.1', '-addext', 'subjectAltName=IP:127.0.0.1',
+         '-keyout', certfile, '-out', certfile],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return certfile
+
+
+def run(certfile, calls, concurrency, pool):
+    stand_in = FakeStatusCake(tests=calls, certfile=certfile).start()
+    cachedir = tempfile.mkdtemp(prefix='statuscake-bench-')
+    try:
+        funcs = load(stand_in, cachedir, {'pool': pool}, {'ca_bundle': certfile})[0]
+        started = time.time()
+        result = funcs['statuscake.get_tests'](list(range(1, calls + 1)), concurrency)
+        wall = time.time() - started
+        return {
+            'pool': pool,
+            'calls': stand_in.total_calls(),
+            'failed': len([res for res in result['data'] if not res['res']]),
+            'handshakes': stand_in.connections,
+            'wall': wall,
+        }
+    finally:
+        stand_in.stop()
+        shutil.rmtree(cachedir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--certfile', help='PEM certificate and key of 127.0.0.1, '
+                                           'generated with openssl when not given')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='statuscake-tls-')
+    try:
+        certfile = args.certfile or make_certificate(directory)
+        print('{0:>6} {1:>7} {2:>7} {3:>11} {4:>8}'.format(
+            'pool', 'calls', 'failed', 'handshakes', 'wall s'))
+        for pool in (True, False):
+            res = run(certfile, args.calls, args.concurrency, pool)
+            print('{0:>6} {1:>7} {2:>7} {3:>11} {4:>8.2f}'.format(
+                str(res['pool']), res['calls'], res['failed'], res['handshakes'],
+                res['wall']))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
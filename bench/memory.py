@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+'''
+Measure the memory held by the cached tests listing
+
+The listing of bench/fake_statuscake.py is decoded from JSON, as it comes
+from the API, then kept either as the decoded dictionnaries or as the
+TestRecord objects of module/statuscake.py. The memory still allocated
+once the listing is built is reported for both.
+
+.. code-block:: bash
+
+    python bench/memory.py --tests 50000
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_statuscake import make_test  # pylint: disable=wrong-import-position
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(path):
+    try:
+        import importlib.util
+    except ImportError:
+        import imp
+        return imp.load_source('statuscake', path)
+    spec = importlib.util.spec_from_file_location('statuscake', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def listing(count):
+    tags = (('bench',), ('bench', 'production'), ('staging',))
+    tests = [make_test(i, tags[i % len(tags)]) for i in range(1, count + 1)]
+    for i, test in enumerate(tests):
+        test['ContactGroup'] = [str(1000 + i % 4)]
+        test['Status'] = 'Down' if i % 50 == 0 else 'Up'
+    return json.dumps(tests)
+
+
+def measure(body, build):
+    gc.collect()
+    tracemalloc.start()
+    data = build(json.loads(body))
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(data), current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--tests', type=int, default=50000)
+    args = parser.parse_args()
+
+    statuscake = load_module(os.path.join(ROOT, 'module', 'statuscake.py'))
+    body = listing(args.tests)
+
+    print('{0:>8} {1:>7} {2:>10} {3:>10}'.format('layout', 'tests', 'MiB', 'B/test'))
+    for layout, build in (
+            ('dict', list),
+            ('record', lambda data: [statuscake.TestRecord(test) for test in data])):
+        count, size = measure(body, build)
+        print('{0:>8} {1:>7} {2:>10.1f} {3:>10.0f}'.format(
+            layout, count, size / 1048576.0, float(size) / max(1, count)))
+
+
+if __name__ == '__main__':
+    main()
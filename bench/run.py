@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+'''
+Benchmark module/statuscake.py and the statuscake_test states
+
+The execution module and the states are loaded through Salt's loader, as on
+a minion, and pointed at bench/fake_statuscake.py. For every account size a
+fresh loader runs a batch of ``statuscake_test.present`` states, half of
+them on existing tests and half creating new ones, and reports:
+
+* API calls per state, as counted by the stand-in
+* wall time and p50/p99 latency per state
+* peak memory allocated while the states run
+
+.. code-block:: bash
+
+    python bench/run.py --sizes 10,1000,50000 --states 200 --latency 0.02
+'''
+
+# Import Python libs
+from __future__ import absolute_import, print_function
+import argparse
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Import salt libs
+import salt.config
+import salt.loader
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from fake_statuscake import FakeStatusCake  # pylint: disable=wrong-import-position
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(round(pct / 100.0 * (len(values) - 1)))
+    return values[rank]
+
+
+def load(stand_in, cachedir, options, minion_opts=None):
+    '''
+    Return the execution modules and states of a fresh minion loader
+    '''
+    opts = salt.config.DEFAULT_MINION_OPTS.copy()
+    opts.update(minion_opts or {})
+    opts.update({
+        'file_client': 'local',
+        'cachedir': cachedir,
+        'module_dirs': [os.path.join(ROOT, 'module')],
+        'states_dirs': [os.path.join(ROOT, 'state')],
+        'test': False,
+        'statuscake': dict({
+            'username': 'bench',
+            'api_key': 'bench',
+            'api_url': stand_in.url,
+        }, **options),
+    })
+    utils = salt.loader.utils(opts)
+    funcs = salt.loader.minion_mods(opts, utils=utils)
+    states = salt.loader.states(opts, funcs, utils, {})
+    return funcs, states
+
+
+def run_size(size, count, latency, rate_limit, options):
+    stand_in = FakeStatusCake(tests=size, ssls=0, latency=latency,
+                              rate_limit=rate_limit).start()
+    cachedir = tempfile.mkdtemp(prefix='statuscake-bench-')
+    try:
+        funcs, states = load(stand_in, cachedir, options)
+        present = states['statuscake_test.present']
+
+        gc.collect()
+        if tracemalloc is not None:
+            tracemalloc.start()
+
+        timings = []
+        failures = 0
+        started = time.time()
+        for i in range(count):
+            if i % 2 and size:
+                test_id = (i // 2) % size + 1
+                name = 'site-{0}'.format(test_id)
+                url = 'https://site-{0}.example.com'.format(test_id)
+            else:
+                name = 'new-{0}'.format(i)
+                url = 'https://new-{0}.example.com'.format(i)
+            before = time.time()
+            ret = present(name, WebsiteName=name, WebsiteURL=url, CheckRate=300)
+            timings.append(time.time() - before)
+            if ret['result'] is False:
+                failures += 1
+        wall = time.time() - started
+
+        peak = 0
+        if tracemalloc is not None:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        return {
+            'size': size,
+            'states': count,
+            'failures': failures,
+            'calls': stand_in.total_calls(),
+            'limited': sum(stand_in.limited.values()),
+            'connections': stand_in.connections,
+            'wall': wall,
+            'p50': percentile(timings, 50),
+            'p99': percentile(timings, 99),
+            'peak': peak,
+        }
+    finally:
+        stand_in.stop()
+        shutil.rmtree(cachedir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default='10,100,1000,10000,50000')
+    parser.add_argument('--states', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds added by the stand-in to every answer')
+    parser.add_argument('--rate-limit', type=int, default=0,
+                        help='requests per second before the stand-in answers 429')
+    parser.add_argument('--option', action='append', default=[],
+                        help='statuscake option as key=value, e.g. inventory_ttl=0')
+    args = parser.parse_args()
+
+    options = {}
+    for option in args.option:
+        key, _, value = option.partition('=')
+        options[key] = int(value) if value.isdigit() else value
+
+    header = ('{0:>7} {1:>6} {2:>5} {3:>9} {4:>7} {5:>6} {6:>9} '
+              '{7:>9} {8:>9} {9:>10}')
+    print(header.format('tests', 'states', 'fail', 'calls', 'c/state', '429',
+                        'wall s', 'p50 ms', 'p99 ms', 'peak MiB'))
+    for size in [int(size) for size in args.sizes.split(',') if size]:
+        res = run_size(size, args.states, args.latency, args.rate_limit, options)
+        print('{0:>7} {1:>6} {2:>5} {3:>9} {4:>7.2f} {5:>6} {6:>9.2f} '
+              '{7:>9.1f} {8:>9.1f} {9:>10.1f}'.format(
+                  res['size'], res['states'], res['failures'], res['calls'],
+                  float(res['calls']) / max(1, res['states']), res['limited'],
+                  res['wall'], res['p50'] * 1000, res['p99'] * 1000,
+                  res['peak'] / 1048576.0))
+
+
+if __name__ == '__main__':
+    main()
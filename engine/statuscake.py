@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+'''
+Keep a mirror of the Statuscake listings in the Salt cache
+
+Every ``interval`` seconds the engine revalidates the listings of each
+profile with ``statuscake.update_mirror`` and stores them in the cache of the
+machine it runs on, only rewriting a listing when it changed. Execution
+modules configured with ``mirror`` then answer lookups from this copy, see
+``module/statuscake.py``.
+
+Run it on the master, with the module in ``module_dirs``:
+
+.. code-block:: yaml
+
+    engines_dirs:
+      - /srv/salt-statuscake/engine
+
+    engines:
+      - statuscake:
+          interval: 60
+          kinds:
+            - test
+            - ssl
+            - contact_group
+          profiles:
+            - statuscake
+            - acme
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 60
+MAX_BACKOFF = 600
+
+
+def __virtual__():
+    return 'statuscake'
+
+
+def _refresh(kinds, profiles):
+    '''
+    Update the mirror of every profile, return False if one failed
+    '''
+    ok = True
+    for profile in profiles:
+        try:
+            result = __salt__['statuscake.update_mirror'](kinds, profile=profile)
+        except Exception as exc:  # pylint: disable=broad-except
+            result = {'res': False, 'message': str(exc), 'data': {}}
+        if result['res']:
+            changed = [kind for kind, state in result['data'].items() if state == 'changed']
+            if changed:
+                log.info('Statuscake mirror of %s updated: %s',
+                         profile or 'statuscake', ', '.join(sorted(changed)))
+        else:
+            ok = False
+            log.warning('Statuscake mirror of %s not updated: %s',
+                        profile or 'statuscake', result['message'])
+    return ok
+
+
+def start(interval=DEFAULT_INTERVAL, kinds=None, profiles=None):
+    '''
+    Refresh the mirror forever
+
+    interval
+        Seconds between two refreshes, doubled after each failed refresh up
+        to 10 minutes
+
+    kinds
+        Inventory kinds to mirror, default to all of them
+
+    profiles
+        Config keys holding the credentials of the accounts to mirror,
+        default to the statuscake key
+    '''
+    if 'statuscake.update_mirror' not in __salt__:
+        log.error('statuscake execution module not available, statuscake engine stopped')
+        return
+
+    profiles = profiles or [None]
+    delay = interval
+    while True:
+        started = time.time()
+        if _refresh(kinds, profiles):
+            delay = interval
+        else:
+            delay = min(delay * 2, max(interval, MAX_BACKOFF))
+        time.sleep(max(0, delay - (time.time() - started)))
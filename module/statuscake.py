@@ -16,64 +16,353 @@ Module for sending value to statuscake
           username: toto
           api_key: peWcBiMOS9HrZG15peWcBiMOS9HrZG15
 
+    Listings returned by ``get_all_tests`` and ``get_all_ssls`` are kept in
+    ``__context__`` for ``inventory_ttl`` seconds (default 300, 0 disables
+    caching) so a highstate only downloads them once per account.
+
+    They are also saved under ``<cachedir>/statuscake`` and revalidated on the
+    next run with a conditional request. A snapshot younger than
+    ``snapshot_max_age`` seconds is used without any request (default 0,
+    always revalidate). ``snapshot: False`` disables the on-disk copy:
+
+    .. code-block:: yaml
+
+        statuscake:
+          inventory_ttl: 300
+          snapshot: True
+          snapshot_max_age: 1800
+
+    Jobs running at the same time on a minion do not download the same
+    listing twice: the fetch is done under a lock file next to the snapshot
+    and the jobs waiting on it reuse the listing it wrote, the snapshot or,
+    when it is disabled, a ``<kind>-<account>.shared.json`` file. Waiters
+    give up after ``coalesce_timeout`` seconds (default 60) and fetch the
+    listing themselves. ``coalesce: False`` disables the lock:
+
+    .. code-block:: yaml
+
+        statuscake:
+          coalesce: True
+          coalesce_timeout: 60
+
+    When ``requests`` is available, calls go through keep-alive sessions
+    pooled per host and credentials for the life of the minion process.
+    They honour ``verify_ssl``, ``ca_bundle``, ``proxy_host``, ``proxy_port``,
+    ``proxy_username``, ``proxy_password`` and ``no_proxy`` from the minion
+    config like ``salt.utils.http``. ``pool: False`` falls back to
+    ``salt.utils.http``:
+
+    .. code-block:: yaml
+
+        statuscake:
+          pool: True
+          pool_size: 10
+          pool_idle_timeout: 60
+
+    ``rate_limit`` (requests per second, 0 for no limit) and ``rate_burst``
+    throttle the calls of each account, and can be given per username.
+    Answers 429 are retried after Retry-After, connection errors and 5xx
+    are retried with jittered exponential backoff for idempotent requests,
+    which excludes creations (Update calls without an id):
+
+    .. code-block:: yaml
+
+        statuscake:
+          rate_limit:
+            default: 5
+            toto: 10
+          rate_burst: 10
+          retries: 3
+          backoff: 0.5
+
+    After ``breaker_failures`` consecutive connection errors, timeouts or
+    5xx from a host, its calls fail at once for ``breaker_cooldown``
+    seconds, then a single call probes it again. ``deadline`` gives each
+    job a budget of seconds shared by all the requests it makes: every
+    state of a state run, or every call of a minion job, is cut to the time
+    left and, once it is spent, fails at once (default 0, no budget). The
+    beacon and the engine run without budget:
+
+    .. code-block:: yaml
+
+        statuscake:
+          breaker_failures: 5
+          breaker_cooldown: 60
+          deadline: 600
+
+    Credentials and options are resolved once per minion process, and again
+    after a pillar refresh. Every function takes a ``profile`` argument
+    naming another config key with its own credentials and options.
+    ``pool_size``, ``pool_idle_timeout`` and ``stats_event`` apply to the
+    whole minion process and are only read from ``statuscake``:
+
+    .. code-block:: yaml
+
+        acme:
+          username: acme
+          api_key: 4Jkp0uUfeX3ZiEo74Jkp0uUfeX3ZiEo7
+          rate_limit: 2
+
+    Once a test is known to match its parameters, a hash of them and of its
+    listing fields is kept under ``<cachedir>/statuscake/fingerprints``. As
+    long as both hash the same, the details call and the update are
+    skipped. Fingerprints older than ``fingerprint_max_age`` seconds
+    (default one day) are ignored so fields missing from the listing are
+    still checked regularly. ``fingerprints: False`` disables them:
+
+    .. code-block:: yaml
+
+        statuscake:
+          fingerprints: True
+          fingerprint_max_age: 86400
+
+    The probe locations of ``get_locations`` are kept on disk for
+    ``locations_ttl`` seconds (default one day), and the last copy is used
+    when StatusCake can not be reached. ``NodeLocations`` are checked
+    against it before any write.
+
+    ``api_url`` sends every call to another base URL, such as the local
+    stand-in of ``bench/fake_statuscake.py``.
+
+    ``mirror`` answers the listings from the copy kept by the
+    ``statuscake`` engine while it is younger than ``mirror_max_age``
+    seconds. Lookups missing from it go to the API, and so do writes naming
+    a test or contact group it does not hold yet. ``local`` reads the cache
+    of this machine (on the master, or with a local engine), ``master``
+    asks the master through ``publish.runner`` (needs ``peer_run`` for
+    ``statuscake.mirror``):
+
+    .. code-block:: yaml
+
+        statuscake:
+          mirror: master
+          mirror_max_age: 600
+
+    Every call is timed and counted per minion process, see
+    ``statuscake.stats``. Jobs run in their own process, so the counters
+    are only meaningful through ``salt-call``; ``salt '*' statuscake.stats``
+    only reports its own calls. With ``stats_event: True`` each job, such as
+    a state run, that reached StatusCake sends the counters of its own calls
+    with its jid as one ``salt/statuscake/stats`` event when its process
+    exits, or when the next job starts for minions running jobs in threads.
+
 '''
 
 # Import Python libs
 from __future__ import absolute_import
+import array
+import calendar
+import codecs
+import hashlib
 import logging
 import json
+import email.utils
+import functools
+import os
+import random
+import tempfile
+import threading
+import time
 
 # Import 3rd-party libs
 # pylint: disable=import-error,no-name-in-module,redefined-builtin
+from salt.ext import six
 from salt.ext.six.moves.urllib.parse import urljoin as _urljoin
 from salt.ext.six.moves.urllib.parse import urlencode as _urlencode
+from salt.ext.six.moves.urllib.parse import urlsplit as _urlsplit
+from salt.ext.six.moves.urllib.parse import urlunsplit as _urlunsplit
+from salt.ext.six.moves.urllib.parse import parse_qs as _parse_qs
+from salt.ext.six.moves.urllib.parse import quote as _quote
 from salt.ext.six.moves import range
 import salt.ext.six.moves.http_client
 # pylint: enable=import-error,no-name-in-module
+import multiprocessing.util
+from multiprocessing.pool import ThreadPool
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Import salt libs
+import salt.cache
+import salt.utils.http
+
+try:
+    import requests
+    import requests.adapters
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 log = logging.getLogger(__name__)
 
 __virtualname__ = 'statuscake'
 
+# type is used to validate and normalize values, details is the name of the
+# field in Tests/Details when it differs. choices and length are checked
+# locally before any call.
 STATUSCAKE_PARAMS_DEFINITION = {
     'test': {
-        'TestID': {'mandatory': False },
-        'Paused': {'mandatory': False },
-        'WebsiteName': {'mandatory': True },
-        'WebsiteURL': {'mandatory': True },
-        'Port': {'mandatory': False },
-        'NodeLocations': {'mandatory': False },
-        'Timeout': {'mandatory': False },
-        'PingURL': {'mandatory': False },
-        'Confirmation': {'mandatory': False },
-        'CheckRate': {'mandatory': True, 'default': 300 },
-        'BasicUser': {'mandatory': False },
-        'BasicPass': {'mandatory': False },
-        'Public': {'mandatory': False },
-        'LogoImage': {'mandatory': False },
-        'Branding': {'mandatory': False },
-        'WebsiteHost': {'mandatory': False },
-        'Virus': {'mandatory': False },
-        'FindString': {'mandatory': False },
-        'DoNotFind': {'mandatory': False },
-        'TestType': {'mandatory': True, 'default': 'HTTP' },
-        'ContactGroup': {'mandatory': False },
-        'RealBrowser': {'mandatory': False },
-        'TriggerRate': {'mandatory': False },
-        'TestTags': {'mandatory': False },
-        'StatusCodes': {'mandatory': False },
+        'TestID': {'mandatory': False, 'type': 'int' },
+        'Paused': {'mandatory': False, 'type': 'bool' },
+        'WebsiteName': {'mandatory': True, 'type': 'str' },
+        'WebsiteURL': {'mandatory': True, 'type': 'str', 'details': 'URI' },
+        'Port': {'mandatory': False, 'type': 'int' },
+        'NodeLocations': {'mandatory': False, 'type': 'list' },
+        'Timeout': {'mandatory': False, 'type': 'int' },
+        'PingURL': {'mandatory': False, 'type': 'str' },
+        'Confirmation': {'mandatory': False, 'type': 'int' },
+        'CheckRate': {'mandatory': True, 'default': 300, 'type': 'int' },
+        'BasicUser': {'mandatory': False, 'type': 'str' },
+        'BasicPass': {'mandatory': False, 'type': 'str' },
+        'Public': {'mandatory': False, 'type': 'bool' },
+        'LogoImage': {'mandatory': False, 'type': 'str' },
+        'Branding': {'mandatory': False, 'type': 'bool' },
+        'WebsiteHost': {'mandatory': False, 'type': 'str' },
+        'Virus': {'mandatory': False, 'type': 'bool' },
+        'FindString': {'mandatory': False, 'type': 'str' },
+        'DoNotFind': {'mandatory': False, 'type': 'bool' },
+        'TestType': {'mandatory': True, 'default': 'HTTP', 'type': 'str',
+                     'choices': ['HTTP', 'HEAD', 'TCP', 'PING', 'DNS', 'SMTP', 'SSH', 'PUSH'] },
+        'ContactGroup': {'mandatory': False, 'type': 'list', 'details': 'ContactGroups' },
+        'RealBrowser': {'mandatory': False, 'type': 'bool' },
+        'TriggerRate': {'mandatory': False, 'type': 'int' },
+        'TestTags': {'mandatory': False, 'type': 'list', 'details': 'Tags' },
+        'StatusCodes': {'mandatory': False, 'type': 'list' },
+    },
+    'ssl': {
+        'id': {'mandatory': False, 'type': 'int' },
+        'domain': {'mandatory': True, 'type': 'str' },
+        'checkrate': {'mandatory': True, 'default': 3600, 'type': 'int',
+                      'choices': [300, 600, 1800, 3600, 86400, 2073600] },
+        'contact_groups': {'mandatory': True, 'default': '', 'type': 'list' },
+        'alert_at': {'mandatory': True, 'default': '1,7,30', 'type': 'list', 'length': 3 },
+        'alert_expiry': {'mandatory': True, 'default': True, 'type': 'bool' },
+        'alert_reminder': {'mandatory': True, 'default': True, 'type': 'bool' },
+        'alert_broken': {'mandatory': True, 'default': True, 'type': 'bool' },
+    },
+    'contact_group': {
+        'ContactID': {'mandatory': False, 'type': 'int' },
+        'GroupName': {'mandatory': True, 'type': 'str' },
+        'DesktopAlert': {'mandatory': False, 'type': 'bool' },
+        'Email': {'mandatory': False, 'type': 'list', 'details': 'Emails' },
+        'Mobile': {'mandatory': False, 'type': 'list', 'details': 'Mobiles' },
+        'PingURL': {'mandatory': False, 'type': 'str' },
+        'Boxcar': {'mandatory': False, 'type': 'str' },
+        'Pushover': {'mandatory': False, 'type': 'str' },
+    },
+}
+
+STATUSCAKE_HOSTS = ('https://www.statuscake.com', 'https://app.statuscake.com')
+
+# How booleans are sent to each API
+STATUSCAKE_BOOLEANS = {
+    'test': (1, 0),
+    'ssl': ('true', 'false'),
+    'contact_group': (1, 0),
+}
+
+# Fields holding contact group IDs, names are resolved before any call
+STATUSCAKE_CONTACT_GROUP_FIELDS = {
+    'test': 'ContactGroup',
+    'ssl': 'contact_groups',
+}
+
+STATUSCAKE_INVENTORY_DEFINITION = {
+    'test': {
+        'url': 'https://www.statuscake.com/API/Tests/',
+        'id': 'TestID',
+        'indexes': {'name': 'WebsiteName', 'url': 'WebsiteURL', 'tag': 'TestTags'},
     },
     'ssl': {
-        'domain': {'mandatory': True },
-        'checkrate': {'mandatory': True, 'default': 3600 },
-        'contact_groups': {'mandatory': True, 'default': ''},
-        'alert_at': {'mandatory': True, 'default': '1,7,30'},
-        'alert_expiry': {'mandatory': True, 'default': True},
-        'alert_reminder': {'mandatory': True, 'default': True},
-        'alert_broken': {'mandatory': True, 'default': True},
+        'url': 'https://app.statuscake.com/API/SSL/',
+        'id': 'id',
+        'indexes': {'url': 'domain'},
+    },
+    'contact_group': {
+        'url': 'https://app.statuscake.com/API/ContactGroups',
+        'id': 'ContactID',
+        'indexes': {'name': 'GroupName'},
+        # Listing names of the parameters sent under another name
+        'fields': {'Email': 'Emails', 'Mobile': 'Mobiles'},
     },
 }
 
+DEFAULT_INVENTORY_TTL = 300
+DEFAULT_MIRROR_MAX_AGE = 600
+DEFAULT_LOCATIONS_TTL = 86400
+DEFAULT_FINGERPRINT_MAX_AGE = 86400
+FINGERPRINT_SHARDS = 64
+# Listing fields which, when unchanged, vouch for an unchanged test
+FINGERPRINT_FIELDS = ('WebsiteName', 'WebsiteURL', 'CheckRate', 'TestType',
+                      'Paused', 'ContactGroup', 'TestTags')
+LOCATIONS_URL = 'https://www.statuscake.com/API/Locations/json'
+# Snapshot owner of the locations listing, which needs no credentials
+LOCATIONS_ACCOUNT = '*'
+MIRROR_BANK = 'statuscake/mirror'
+DEFAULT_SNAPSHOT_MAX_AGE = 0
+DEFAULT_COALESCE_TIMEOUT = 60
+DEFAULT_POOL_SIZE = 10
+DEFAULT_POOL_IDLE_TIMEOUT = 60
+DEFAULT_CONCURRENCY = 10
+DEFAULT_HISTORY_DAYS = 30
+DEFAULT_HISTORY_PAGE = 1000
+HISTORY_PERCENTILES = (50, 95, 99)
+DEFAULT_RATE_LIMIT = 0
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_COOLDOWN = 60
+DEFAULT_DEADLINE = 0
+
+TOO_MANY_REQUESTS = 429
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'DELETE')
+# A PUT naming the object it updates is idempotent, without it creates one
+UPDATE_ID_FIELDS = ('TestID', 'id', 'ContactID')
+
+# Keep-alive sessions, shared by every call of this minion process
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
+
+# Token buckets per account, shared by every call of this minion process
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+# Circuit breakers per host, shared by every call of this minion process
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+# Outermost call running in the calling thread, see _entry_point
+_CALL = threading.local()
+_JOB_LOCK = threading.Lock()
+
+# Resolved options per profile name
+_PROFILES = {}
+_PROFILES_LOCK = threading.Lock()
+
+# Call and cache counters of this minion process, see stats()
+_STATS = {'calls': {}, 'cache': {}, 'since': time.time()}
+_STATS_LOCK = threading.Lock()
+
+# Repeated listing values, shared by every TestRecord of the process
+_INTERNED = {}
+
+# Serializes cached listing patches done by bulk worker threads
+_INVENTORY_LOCK = threading.RLock()
+
 
 def __virtual__():
     '''
@@ -83,82 +372,859 @@ def __virtual__():
     '''
     return __virtualname__
 
+class _Field(object):
+    '''
+    One compiled entry of STATUSCAKE_PARAMS_DEFINITION
+    '''
+    __slots__ = ('name', 'type', 'choices', 'length', 'true', 'false')
+
+    def __init__(self, name, config, booleans):
+        self.name = name
+        self.type = config.get('type', 'str')
+        self.choices = frozenset(config['choices']) if 'choices' in config else None
+        self.length = config.get('length')
+        self.true, self.false = booleans
+
+    def coerce(self, value):
+        '''
+        Return the value as sent to the API, raise ValueError when invalid
+        '''
+        if self.type == 'int':
+            if isinstance(value, bool):
+                raise ValueError('expected an integer')
+            value = int(value)
+        elif self.type == 'bool':
+            if isinstance(value, six.string_types):
+                lowered = value.strip().lower()
+                if lowered in ('1', 'true', 'yes', 'on'):
+                    value = True
+                elif lowered in ('0', 'false', 'no', 'off', ''):
+                    value = False
+                else:
+                    raise ValueError('expected a boolean')
+            elif value not in (True, False, 0, 1):
+                raise ValueError('expected a boolean')
+            value = self.true if value else self.false
+        elif self.type == 'list':
+            if isinstance(value, (list, tuple)):
+                items = [str(item).strip() for item in value]
+            else:
+                items = [item.strip() for item in str(value).split(',')]
+            items = [item for item in items if item]
+            if self.length is not None and len(items) != self.length:
+                raise ValueError('expected {0} values'.format(self.length))
+            value = ','.join(items)
+        elif not isinstance(value, six.string_types):
+            value = str(value)
+
+        if self.choices is not None and value not in self.choices:
+            raise ValueError('expected one of {0}'.format(
+                ', '.join(str(choice) for choice in sorted(self.choices))))
+        return value
+
+class _Schema(object):
+    '''
+    STATUSCAKE_PARAMS_DEFINITION[obj] compiled once at load time
+    '''
+
+    def __init__(self, obj, definition):
+        booleans = STATUSCAKE_BOOLEANS[obj]
+        self.fields = dict((name, _Field(name, config, booleans))
+                           for name, config in definition.items())
+        self.required = frozenset(name for name, config in definition.items()
+                                  if config['mandatory'] and 'default' not in config)
+        self.defaults = {}
+        for name, config in definition.items():
+            if config['mandatory'] and 'default' in config:
+                self.defaults[name] = self.fields[name].coerce(config['default'])
+            elif config.get('default'):
+                self.defaults[name] = self.fields[name].coerce(config['default'])
+
+    def validate(self, kwargs):
+        args = dict(self.defaults)
+        fields = self.fields
+        for name, value in kwargs.items():
+            field = fields.get(name)
+            if field is None or value is None:
+                continue
+            try:
+                args[name] = field.coerce(value)
+            except (TypeError, ValueError) as exc:
+                return {'res': False,
+                        'message': 'Invalid value {0!r} for {1}: {2}'.format(value, name, exc)}
+
+        for name in self.required:
+            if name not in args:
+                return {'res': False, 'message': 'Mandatory params %s is missing' % name }
+
+        return {'res': True, 'data': args }
+
+_SCHEMAS = dict((obj, _Schema(obj, definition))
+                for obj, definition in STATUSCAKE_PARAMS_DEFINITION.items())
+
 def build_args(obj, **kwargs):
     '''
     Helpers to build parameters
-    According to STATUSCAKE_PARAMS_DEFINITION return formated args
+    According to STATUSCAKE_PARAMS_DEFINITION return formated args,
+    coerced to the expected types. Invalid values fail without any call.
     '''
 
+    if obj not in _SCHEMAS:
+        raise Exception('%s not in STATUSCAKE_PARAMS_DEFINITION' % obj)
+
+    return _SCHEMAS[obj].validate(kwargs)
+
+def _normalize_value(kind, value):
+    '''
+    Bring a parameter value to a comparable form according to its type
+    '''
+    if kind == 'list':
+        if value is None or value == '':
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = str(value).split(',')
+        items = []
+        for item in value:
+            # Tests/Details returns contact groups as objects
+            if isinstance(item, dict):
+                item = item.get('ID', item.get('ContactID'))
+            if item is not None and str(item).strip():
+                items.append(str(item).strip())
+        return sorted(items)
+    if value is None or value == '':
+        return None
+    if kind == 'int':
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return str(value)
+    if kind == 'bool':
+        if isinstance(value, six.string_types):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return bool(value)
+    return str(value)
+
+def normalize_params(obj, details=False, **kwargs):
+    '''
+    Normalize parameters according to STATUSCAKE_PARAMS_DEFINITION types.
+    Unknown parameters are dropped.
+
+    :param obj: test or ssl. MANDATORY
+    :param details: kwargs come from a details call and use its field names.
+
+    :return: dictionnary of normalized parameters.
+    '''
     if obj not in STATUSCAKE_PARAMS_DEFINITION:
         raise Exception('%s not in STATUSCAKE_PARAMS_DEFINITION' % obj)
 
-    args = {}
+    ret = {}
     for k, config in STATUSCAKE_PARAMS_DEFINITION[obj].items():
-        if config['mandatory']:
-            if k not in kwargs:
-                if 'default' in config:
-                    args[k] = config['default']
-                else:
-                    return {'res': False, 'message': 'Mandatory params %s is missing' % k }
-            else:
-                args[k] = kwargs[k]
-        elif k in kwargs:
-            args[k] = kwargs[k]
-        elif 'default' in config and config['default']:
-            args[k] = config['default']
+        source = config.get('details', k) if details else k
+        if source not in kwargs:
+            continue
+        ret[k] = _normalize_value(config.get('type', 'str'), kwargs[source])
+    return ret
+
+def diff_params(obj, current, desired):
+    '''
+    Field level diff between current details and desired parameters.
+    Only fields given in desired, and known by the details call, are compared.
+
+    :param obj: test or ssl. MANDATORY
+    :param current: parameters as returned by the details call. MANDATORY
+    :param desired: parameters as given to add_test or add_ssl. MANDATORY
 
-    return {'res': True, 'data': args }
+    :return: dictionnary of field: {'old': value, 'new': value}.
+    '''
+    old = normalize_params(obj, details=True, **current)
+    new = normalize_params(obj, **dict((k, v) for k, v in desired.items()
+                                       if v is not None))
+    return dict((k, {'old': old[k], 'new': v}) for k, v in new.items()
+                if k in old and old[k] != v)
+
+class _Profile(object):
+    '''
+    Statuscake options resolved once per process.
+
+    A named profile is a config key holding its own username, api_key and
+    options, any option it does not set is looked up in statuscake.
+    '''
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        self.resolved = {}
+
+    def get(self, key, default=None):
+        if key not in self.resolved:
+            value = self.options.get(key)
+            if value is None or value == '':
+                value = __salt__['config.get']('statuscake.{0}'.format(key))
+            if value is None or value == '':
+                value = __salt__['config.get']('statuscake:{0}'.format(key))
+            self.resolved[key] = value
+        value = self.resolved[key]
+        if value is None or value == '':
+            return default
+        return value
+
+def _pillar_token(profile):
+    '''
+    Objects replaced when the pillar is refreshed
+    '''
+    try:
+        pillar = __pillar__
+    except NameError:
+        return (None, None)
+    return (pillar, pillar.get(profile or 'statuscake'))
 
-def _check_api_key(api_key):
+def _get_profile(profile=None):
+    '''
+    Return the cached _Profile for profile, a config key name or a dict.
+    Cached profiles are dropped once the pillar has been refreshed.
+    '''
+    if isinstance(profile, dict):
+        return _Profile(profile)
+
+    token = _pillar_token(profile)
+    with _PROFILES_LOCK:
+        cached = _PROFILES.get(profile)
+        if cached is not None and cached[0][0] is token[0] \
+                and cached[0][1] is token[1]:
+            return cached[1]
+
+    options = {}
+    if profile:
+        options = __salt__['config.get'](profile) or {}
+        if not isinstance(options, dict):
+            options = {}
+    result = _Profile(options)
+
+    with _PROFILES_LOCK:
+        _PROFILES[profile] = (token, result)
+    return result
+
+def _get_config(key, default=None, profile=None):
+    '''
+    Lookup a statuscake option, accepting both dotted and nested forms
+    '''
+    return _get_profile(profile).get(key, default)
+
+def _check_api_key(api_key, profile=None):
     if not api_key:
-        api_key = __salt__['config.get']('statuscake.api_key') or \
-            __salt__['config.get']('statuscake:api_key')
+        api_key = _get_config('api_key', profile=profile)
 
         if not api_key:
             return {'res': False, 'message': 'No Statuscake api_key found'}
 
     return { 'res': True, 'data': api_key }
 
-def _check_api_username(username):
+def _check_api_username(username, profile=None):
     if not username:
-        username = __salt__['config.get']('statuscake.username') or \
-            __salt__['config.get']('statuscake:username')
+        username = _get_config('username', profile=profile)
 
         if not username:
             return {'res': False, 'message': 'No Statuscake username found'}
 
     return { 'res': True, 'data': username }
 
+def _invalid_body(result):
+    '''
+    Message for a 200 answer whose body is not JSON, None if it is
+    '''
+    if 'dict' in result:
+        return None
+    body = result.get('error') or result.get('text') or ''
+    return 'Statuscake returned an invalid answer: {0}'.format(str(body)[:200])
+
 def _handle_get_result(result):
     ret = {'message': '', 'res': True}
     if result.get('status', None) == salt.ext.six.moves.http_client.OK:
+        invalid = _invalid_body(result)
+        if invalid:
+            ret['res'] = False
+            ret['message'] = invalid
+            return ret
         _result = result['dict']
         if 'ErrNo' in _result:
             ret['res'] = False
             ret['message'] = _result['Error']
         else:
             ret['data'] = _result
+    elif result.get('status', None) == salt.ext.six.moves.http_client.NOT_MODIFIED:
+        ret['not_modified'] = True
+    else:
+        log.debug(result)
+        ret['res'] = False
+        ret['message'] = result.get('error', 'Statuscake returned status {0}'.format(result.get('status')))
     return ret
 
 def _handle_generic_result(result):
     ret = {'message': '', 'res': True}
 
     if result.get('status', None) == salt.ext.six.moves.http_client.OK:
+        invalid = _invalid_body(result)
+        if invalid is None and not isinstance(result['dict'], dict):
+            invalid = 'Statuscake returned an invalid answer: {0}'.format(str(result['dict'])[:200])
+        if invalid:
+            ret['res'] = False
+            ret['message'] = invalid
+            return ret
         _result = result['dict']
-        if not _result['Success']:
+        if not _result.get('Success'):
             ret['res'] = False
-            ret['message'] = _result['Message']
+            ret['message'] = _result.get('Message', '')
         else:
-            ret['message'] = _result['Message']
+            ret['message'] = _result.get('Message', '')
         ret['raw'] = _result
     elif result.get('status', None) == salt.ext.six.moves.http_client.NO_CONTENT:
         return True
     else:
         log.debug(result)
         ret['res'] = False
+        ret['message'] = result.get('error', 'Statuscake returned status {0}'.format(result.get('status')))
     return ret
 
 
+def _get_session(url, username=None, api_key=None):
+    '''
+    Return the pooled keep-alive session for this host and credentials.
+    Sessions idle for more than pool_idle_timeout are closed.
+    '''
+    host = _urlsplit(url).netloc.lower()
+    secret = hashlib.sha1(str(api_key).encode('utf-8')).hexdigest() if api_key else None
+    key = (host, username, secret)
+    idle_timeout = int(_get_config('pool_idle_timeout', DEFAULT_POOL_IDLE_TIMEOUT))
+    now = time.time()
+
+    with _SESSIONS_LOCK:
+        for other, (session, last_used) in list(_SESSIONS.items()):
+            if idle_timeout and now - last_used > idle_timeout:
+                session.close()
+                del _SESSIONS[other]
+
+        if key in _SESSIONS:
+            session = _SESSIONS[key][0]
+        else:
+            size = int(_get_config('pool_size', DEFAULT_POOL_SIZE))
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1,
+                                                    pool_maxsize=size)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+        _SESSIONS[key] = (session, now)
+    return session
+
+def _stats_scopes():
+    '''
+    Counters to update: the process ones, and the running job ones
+    '''
+    call = _current_call()
+    if call is None:
+        return (_STATS,)
+    return (_STATS, call['job']['stats'])
+
+def _record_call(account, url, method, status, elapsed, size=0, decoding=0.0, retry=False):
+    '''
+    Count one API call per account, endpoint, method and status
+    '''
+    key = (account or 'anonymous', _urlsplit(url).path.rstrip('/') or '/',
+           method, status)
+    with _STATS_LOCK:
+        for scope in _stats_scopes():
+            counters = scope['calls'].get(key)
+            if counters is None:
+                counters = scope['calls'][key] = {
+                    'count': 0, 'seconds': 0.0, 'bytes': 0,
+                    'decode_seconds': 0.0, 'retries': 0}
+            if retry:
+                counters['retries'] += 1
+                continue
+            counters['count'] += 1
+            counters['seconds'] += elapsed
+            counters['bytes'] += size
+            counters['decode_seconds'] += decoding
+
+def _record_cache(kind, account, outcome):
+    '''
+    Count inventory lookups per kind, account and outcome: hit, snapshot,
+    not_modified, coalesced or miss
+    '''
+    key = (kind, account or 'anonymous', outcome)
+    with _STATS_LOCK:
+        for scope in _stats_scopes():
+            scope['cache'][key] = scope['cache'].get(key, 0) + 1
+
+def _register_stats_event():
+    '''
+    Have the running job send its stats summary once, when it ends
+    '''
+    call = _current_call()
+    if call is None or not _get_config('stats_event', False):
+        return
+    job = call['job']
+    with _JOB_LOCK:
+        if job['event'] is not None:
+            return
+        job['event'] = 'pending'
+    # Run when the job process exits, like the other multiprocessing
+    # finalizers, or earlier if a new job replaces it
+    multiprocessing.util.Finalize(None, _finish_job, args=(job,), exitpriority=10)
+
+def _finish_job(job):
+    '''
+    Send the stats summary of job if it is still pending
+    '''
+    with _JOB_LOCK:
+        if job['event'] != 'pending':
+            return
+        job['event'] = 'sent'
+    _fire_stats_event(job)
+
+def _session_options(url):
+    '''
+    TLS and proxy options of the minion config, as salt.utils.http applies
+    them, for a requests call to url
+    '''
+    verify = __opts__.get('verify_ssl', True)
+    if verify and __opts__.get('ca_bundle'):
+        verify = __opts__['ca_bundle']
+    options = {'verify': verify}
+
+    proxy_host = __opts__.get('proxy_host')
+    proxy_port = __opts__.get('proxy_port')
+    if not proxy_host or not proxy_port:
+        return options
+    host = _urlsplit(url).hostname or ''
+    for domain in __opts__.get('no_proxy') or []:
+        domain = domain.lstrip('.')
+        if host == domain or host.endswith('.' + domain):
+            return options
+
+    auth = ''
+    if __opts__.get('proxy_username'):
+        auth = '{0}:{1}@'.format(_quote(__opts__['proxy_username'], safe=''),
+                                 _quote(__opts__.get('proxy_password') or '', safe=''))
+    if '://' in proxy_host:
+        scheme, _, proxy_host = proxy_host.partition('://')
+    else:
+        scheme = 'http'
+    proxy = '{0}://{1}{2}:{3}'.format(scheme, auth, proxy_host, proxy_port)
+    options['proxies'] = {'http': proxy, 'https': proxy}
+    return options
+
+def _fire_stats_event(job):
+    with _STATS_LOCK:
+        data = _stats_data(job['stats'])
+    data['jid'] = job['jid']
+    try:
+        __salt__['event.send']('salt/statuscake/stats', data)
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug('Unable to send statuscake stats event: %s', exc)
+
+def _http_request(url, method, data=None, header_dict=None,
+                  username=None, api_key=None, timeout=None, stream=False, profile=None):
+    '''
+    Perform the HTTP call, returning a dict shaped like salt.utils.http.query
+    Every call is timed and counted, see stats(). A streamed 200 answer is
+    returned unread in response, its reader counts it.
+    '''
+    started = time.time()
+    size = 0
+    decoding = 0.0
+    result = _do_http_request(url, method, data, header_dict, username, api_key, timeout,
+                              stream, profile)
+    if 'response' in result:
+        result['_started'] = started
+        _register_stats_event()
+        return result
+    if '_bytes' in result:
+        size = result.pop('_bytes')
+        decoding = result.pop('_decode_seconds')
+    elapsed = time.time() - started
+
+    _record_call(username, url, method, result.get('status'), elapsed, size, decoding)
+    _register_stats_event()
+    log.debug('Statuscake %s %s: status %s in %.3fs, %s bytes',
+              method, _urlsplit(url).path, result.get('status'), elapsed, size)
+    return result
+
+def _api_url(url, profile=None):
+    '''
+    Point url to the api_url option when it is set
+    '''
+    api_url = _get_config('api_url', profile=profile)
+    if api_url:
+        for host in STATUSCAKE_HOSTS:
+            if url.startswith(host):
+                return api_url.rstrip('/') + url[len(host):]
+    return url
+
+def _do_http_request(url, method, data=None, header_dict=None,
+                     username=None, api_key=None, timeout=None, stream=False, profile=None):
+    url = _api_url(url, profile)
+    opts_timeout = __opts__.get('http_request_timeout')
+    if timeout is None or (opts_timeout and opts_timeout < timeout):
+        timeout = opts_timeout
+
+    if not HAS_REQUESTS or not _get_config('pool', True, profile):
+        opts = __opts__
+        if timeout != opts_timeout:
+            opts = dict(__opts__, http_request_timeout=timeout)
+        return salt.utils.http.query(
+            url,
+            method,
+            data=data,
+            decode=True,
+            status=True,
+            headers=True,
+            header_dict=header_dict,
+            opts=opts,
+        )
+
+    session = _get_session(url, username, api_key)
+    try:
+        response = session.request(
+            method,
+            url,
+            data=data,
+            headers=header_dict,
+            timeout=timeout,
+            stream=stream,
+            **_session_options(url)
+        )
+    except requests.exceptions.RequestException as exc:
+        return {'error': str(exc)}
+
+    if stream and response.status_code == salt.ext.six.moves.http_client.OK:
+        return {'status': response.status_code, 'headers': dict(response.headers),
+                'response': response}
+
+    result = {'status': response.status_code, 'headers': dict(response.headers),
+              '_bytes': len(response.content), '_decode_seconds': 0.0}
+    if response.content:
+        started = time.time()
+        try:
+            result['dict'] = response.json()
+        except ValueError:
+            result['error'] = response.text
+        result['_decode_seconds'] = time.time() - started
+    return result
+
+class _TokenBucket(object):
+    '''
+    Token bucket shared by every call made with one account.
+
+    The rate is halved each time StatusCake answers 429 and slowly grows
+    back to the configured rate on success.
+    '''
+
+    def __init__(self, rate, burst):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+        self.throttled = 0.0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def acquire(self):
+        '''
+        Take one token, sleeping until it is available
+        '''
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            self.throttled += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, retry_after=None):
+        with self.lock:
+            self.rate_limited += 1
+            self.rate = max(self.max_rate / 32, self.rate / 2)
+            if retry_after:
+                self.tokens = min(self.tokens, -retry_after * self.rate)
+
+    def reward(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+def _get_account_option(key, account, default, profile=None):
+    '''
+    Options such as rate_limit can be a value or a dict keyed by username
+    '''
+    value = _get_config(key, default, profile)
+    if isinstance(value, dict):
+        value = value.get(account, value.get('default', default))
+    return value
+
+def _get_rate_limiter(account, profile=None):
+    '''
+    Return the process wide token bucket of account, None when unlimited
+    '''
+    rate = float(_get_account_option('rate_limit', account, DEFAULT_RATE_LIMIT, profile))
+    if rate <= 0:
+        return None
+    with _RATE_LIMITERS_LOCK:
+        bucket = _RATE_LIMITERS.get(account)
+        if bucket is None or bucket.max_rate != rate:
+            burst = float(_get_account_option('rate_burst', account, rate, profile))
+            bucket = _TokenBucket(rate, max(1.0, burst))
+            _RATE_LIMITERS[account] = bucket
+    return bucket
+
+def _retry_after(headers):
+    '''
+    Parse a Retry-After header given in seconds or as an HTTP date
+    '''
+    value = _get_header(headers, 'Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        date = email.utils.parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, email.utils.mktime_tz(date) - time.time())
+
+class _CircuitBreaker(object):
+    '''
+    Consecutive failures of one host.
+
+    Once threshold failures in a row are reached the breaker opens and calls
+    are refused for cooldown seconds. Then a single call is let through, its
+    success closes the breaker and its failure opens it again.
+    '''
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = float(cooldown)
+        self.failures = 0
+        self.opened = None
+        self.probing = False
+        self.lock = threading.Lock()
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        with self.lock:
+            if self.opened is None:
+                return True
+            if self.probing or time.time() - self.opened < self.cooldown:
+                self.rejected += 1
+                return False
+            self.probing = True
+            return True
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened = None
+            self.probing = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                if self.opened is None:
+                    self.trips += 1
+                self.opened = time.time()
+            self.probing = False
+
+    def remaining(self):
+        with self.lock:
+            if self.opened is None:
+                return 0
+            return max(0, self.cooldown - (time.time() - self.opened))
+
+def _get_breaker(host, profile=None):
+    '''
+    Return the process wide circuit breaker of host, None when disabled
+    '''
+    threshold = int(_get_config('breaker_failures', DEFAULT_BREAKER_FAILURES, profile))
+    if threshold <= 0:
+        return None
+    cooldown = float(_get_config('breaker_cooldown', DEFAULT_BREAKER_COOLDOWN, profile))
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(host)
+        if breaker is None or (breaker.threshold, breaker.cooldown) != (threshold, cooldown):
+            breaker = _CircuitBreaker(threshold, cooldown)
+            _BREAKERS[host] = breaker
+    return breaker
+
+def _current_call():
+    return getattr(_CALL, 'call', None)
+
+def _context_job(jid=None):
+    '''
+    Return the job kept in __context__, which lives as long as the state run
+    or the minion job. A call made with another jid, or from a process
+    forked since, starts a new job.
+    '''
+    finished = None
+    with _JOB_LOCK:
+        job = __context__.get('statuscake.job')
+        if job is None or job['pid'] != os.getpid() or (jid is not None and job['jid'] != jid):
+            if job is not None and job['pid'] == os.getpid():
+                finished = job
+            job = {'jid': jid, 'pid': os.getpid(), 'deadline': None, 'event': None,
+                   'stats': {'calls': {}, 'cache': {}, 'since': time.time()}}
+            __context__['statuscake.job'] = job
+    if finished is not None:
+        _finish_job(finished)
+    return job
+
+def _entry_point(func):
+    '''
+    Run each outermost call of func in the job of __context__: every call
+    of a state run or of a minion job, nested or from the workers of
+    _run_concurrently, shares its deadline and its stats.
+    Salt job arguments (__pub_*) are dropped, __pub_jid tells jobs apart.
+    '''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        jid = kwargs.get('__pub_jid')
+        for key in [key for key in kwargs if key.startswith('__pub_')]:
+            del kwargs[key]
+        if _current_call() is not None:
+            return func(*args, **kwargs)
+        _CALL.call = {'job': _context_job(jid), 'unbounded': False}
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _CALL.call = None
+    return wrapper
+
+def _without_deadline():
+    '''
+    Exempt the running call from the deadline, for background callers
+    '''
+    call = _current_call()
+    if call is not None:
+        call['unbounded'] = True
+
+def _get_deadline(profile=None):
+    '''
+    Return the budget of the running job, None when deadline is not set,
+    outside of a job or for an exempted call. The budget starts with the
+    first call of the job and is shared by the calls that follow.
+    '''
+    budget = float(_get_config('deadline', DEFAULT_DEADLINE, profile))
+    call = _current_call()
+    if budget <= 0 or call is None or call['unbounded']:
+        return None
+    job = call['job']
+    with _JOB_LOCK:
+        deadline = job['deadline']
+        if not deadline or deadline['budget'] != budget:
+            deadline = {'budget': budget, 'expires': time.time() + budget}
+            job['deadline'] = deadline
+    return deadline
+
+def _fail_fast(host, breaker, deadline):
+    '''
+    Reason to refuse a call to host, None to make it
+    '''
+    if deadline is not None and time.time() >= deadline['expires']:
+        return ('Statuscake time budget of {0:g}s for this job is spent, '
+                'call not made').format(deadline['budget'])
+    if breaker is not None and not breaker.allow():
+        return ('Statuscake host {0} failed {1} times in a row, calls suspended '
+                'for {2:.0f}s').format(host, breaker.failures, breaker.remaining())
+    return None
+
+def _idempotent(method, data=None):
+    '''
+    True when sending the request twice has the same effect as once
+    '''
+    if method in IDEMPOTENT_METHODS:
+        return True
+    if method == 'PUT' and data:
+        fields = _parse_qs(data) if isinstance(data, six.string_types) else data
+        return any(fields.get(field) for field in UPDATE_ID_FIELDS)
+    return False
+
+def _send(url, method, data=None, header_dict=None, username=None,
+          api_key=None, profile=None, stream=False):
+    '''
+    Rate limited _http_request, going through the circuit breaker of the
+    host and the deadline of the job.
+
+    429 answers are retried for every method, honouring Retry-After.
+    Connection errors and 5xx are only retried for idempotent requests, with
+    jittered exponential backoff: a PUT without id creates an object and
+    may have been applied even though its answer was lost.
+    With stream, a 200 answer is returned unread in response.
+    '''
+    account = username or _urlsplit(url).netloc.lower()
+    host = _urlsplit(_api_url(url, profile)).netloc.lower()
+    bucket = _get_rate_limiter(account, profile)
+    breaker = _get_breaker(host, profile)
+    deadline = _get_deadline(profile)
+    retries = int(_get_config('retries', DEFAULT_RETRIES, profile))
+    backoff = float(_get_config('backoff', DEFAULT_BACKOFF, profile))
+
+    attempt = 0
+    while True:
+        refused = _fail_fast(host, breaker, deadline)
+        if refused:
+            log.debug('%s %s not sent: %s', method, url, refused)
+            return {'error': refused}
+        if bucket is not None:
+            bucket.acquire()
+        timeout = None
+        if deadline is not None:
+            timeout = max(0.001, deadline['expires'] - time.time())
+        result = _http_request(url, method, data=data, header_dict=header_dict,
+                               username=username, api_key=api_key, timeout=timeout,
+                               stream=stream, profile=profile)
+        status = result.get('status')
+
+        failed = status is None or status >= 500
+        if breaker is not None:
+            if failed:
+                breaker.failure()
+            else:
+                breaker.success()
+
+        if status == TOO_MANY_REQUESTS:
+            delay = _retry_after(result.get('headers'))
+            if bucket is not None:
+                bucket.penalize(delay)
+        elif failed and _idempotent(method, data):
+            delay = None
+        else:
+            if bucket is not None:
+                bucket.reward()
+            return result
+
+        if attempt >= retries:
+            log.debug('Giving up on %s %s after %s retries', method, url, attempt)
+            return result
+
+        if delay is None:
+            delay = random.uniform(0, min(MAX_BACKOFF, backoff * 2 ** attempt))
+        if deadline is not None and time.time() + delay >= deadline['expires']:
+            log.debug('Giving up on %s %s, no time left for a retry', method, url)
+            return result
+        attempt += 1
+        _record_call(username, url, method, status, 0, retry=True)
+        if bucket is not None:
+            with bucket.lock:
+                bucket.retries += 1
+                bucket.throttled += delay
+        log.debug('Retrying %s %s in %.2fs (status %s)', method, url, delay, status)
+        time.sleep(delay)
+
 def _query(url,
            username=None,
            api_key=None,
@@ -166,6 +1232,8 @@ def _query(url,
            args=None,
            header_dict=None,
            method='GET',
+           with_headers=False,
+           profile=None,
            ):
     '''
     Statuscake object method function to construct and execute on the API URL.
@@ -175,16 +1243,18 @@ def _query(url,
     :param function:    The Statuscake api function to perform.
     :param method:      The HTTP method, e.g. GET or POST.
     :param data:        The data to be sent for POST method.
+    :param with_headers: Add the response headers to the returned dict.
+    :param profile:     Name of the config key holding the credentials.
     :return:            The json response from the API call or False.
     '''
 
     if auth:
-        test = _check_api_key(api_key)
+        test = _check_api_key(api_key, profile)
         if not test['res']:
             return test
         api_key = test['data']
 
-        test = _check_api_username(username)
+        test = _check_api_username(username, profile)
         if not test['res']:
             return test
         username = test['data']
@@ -204,121 +1274,1157 @@ def _query(url,
     if args:
         args = _urlencode(args)
 
-    result = salt.utils.http.query(
-        url,
-        method,
-        data=args,
-        decode=True,
-        status=True,
-        header_dict=header_dict,
-        opts=__opts__,
-    )
+    result = _send(url, method, data=args, header_dict=header_dict,
+                   username=username, api_key=api_key, profile=profile)
 
     if method == 'GET':
-        return _handle_get_result(result)
+        ret = _handle_get_result(result)
     else:
-        return _handle_generic_result(result)
-
-def get_locations():
-    '''
-    API locations endpoint
-
-    :return: dictionnary with res = True or False and message or error.
-
-    CLI Example:
+        ret = _handle_generic_result(result)
 
-    .. code-block:: bash
+    if with_headers and isinstance(ret, dict):
+        ret['headers'] = result.get('headers') or {}
+    return ret
 
-        salt '*' statuscake.get_locations
+def _get_account(username, profile=None):
     '''
-    ret = {'message': '', 'res': True}
-
-    url = 'https://www.statuscake.com/API/Locations/json'
-    result = salt.utils.http.query(url,'GET', decode=True, status=True)
-    if result.get('status', None) == salt.ext.six.moves.http_client.OK:
-        _result = result['dict']
-        ret['message'] = _result.values()
-    else:
-        ret['res'] = False
-
-    return  ret
-
-
-def add_test(WebsiteName, WebsiteURL, CheckRate=60, TestType='HTTP', api_key=None, api_username=None, **kwargs):
+    Return the username used as the inventory cache key
     '''
-    Add a statuscake test
-
-    :param WebsiteName: WebsiteName. MANDATORY
-    :param WebsiteURL: WebsiteURL. MANDATORY
-    :param CheckRate: CheckRate. MANDATORY default to 60
-    :param TestType: TestType. MANDATORY default to HTTP
-    :param api_key: Statuscacke API key.
-    :param api_username: Statuscake API username.
-
-    :return: dictionnary with res = True or False and message or error.
+    test = _check_api_username(username, profile)
+    return test.get('data')
+
+def _inventory_cache():
+    return __context__.setdefault('statuscake.inventory', {})
+
+def _intern(value):
+    if isinstance(value, six.string_types):
+        return _INTERNED.setdefault(value, value)
+    return value
+
+def _intern_list(value):
+    if value is None or value == '':
+        return ()
+    if not isinstance(value, (list, tuple)):
+        value = str(value).split(',')
+    return tuple(_intern(item.strip() if isinstance(item, six.string_types) else item)
+                 for item in value
+                 if not isinstance(item, six.string_types) or item.strip())
+
+class TestRecord(object):
     '''
+    Compact entry of the tests listing.
 
-    if not kwargs:
-        kwargs = {}
+    Repeated strings are interned and list fields are kept as tuples.
+    Fields unknown to TEST_FIELDS are kept aside in a dictionnary.
+    Reads like the dictionnary it was built from, use to_dict() to get one.
+    '''
+    TEST_FIELDS = ('TestID', 'Paused', 'TestType', 'WebsiteName', 'WebsiteURL',
+                   'CheckRate', 'ContactGroup', 'ContactID', 'Status', 'Uptime',
+                   'Public', 'NormalisedResponse', 'TestTags')
+    INTERNED_FIELDS = frozenset(('TestType', 'Status'))
+    LIST_FIELDS = frozenset(('ContactGroup', 'TestTags'))
+    __slots__ = TEST_FIELDS + ('_extra',)
+
+    def __init__(self, data):
+        self._extra = None
+        for field in self.TEST_FIELDS:
+            setattr(self, field, None)
+        self.update(data)
+
+    def update(self, data):
+        for key, value in data.items():
+            if key in self.LIST_FIELDS:
+                value = _intern_list(value)
+            elif key in self.INTERNED_FIELDS:
+                value = _intern(value)
+            if key in self.TEST_FIELDS:
+                setattr(self, key, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def __getitem__(self, key):
+        if key in self.TEST_FIELDS:
+            return getattr(self, key)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.TEST_FIELDS or bool(self._extra and key in self._extra)
+
+    def get(self, key, default=None):
+        try:
+            value = self[key]
+        except KeyError:
+            return default
+        return default if value is None else value
+
+    def to_dict(self):
+        ret = {}
+        for field in self.TEST_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                ret[field] = list(value) if field in self.LIST_FIELDS else value
+        if self._extra:
+            ret.update(self._extra)
+        return ret
 
-    kwargs['WebsiteName'] = WebsiteName
-    kwargs['WebsiteURL'] = WebsiteURL
-    kwargs['CheckRate'] = CheckRate
-    kwargs['TestType'] = TestType
+    def __repr__(self):
+        return 'TestRecord({0!r})'.format(self.to_dict())
 
-    test = build_args('test', **kwargs)
-    if not test['res']:
-        return test
-    params = test['data']
+_RECORD_TYPES = {'test': TestRecord}
 
-    url = 'https://www.statuscake.com/API/Tests/Update'
-    method = 'PUT'
+def _make_record(kind, data):
+    return _RECORD_TYPES.get(kind, dict)(data)
 
-    return _query(url=url,
-            method=method, username=api_username,
-            api_key=api_key, auth=True, args=params)
+def _record_dicts(data):
+    return [record.to_dict() if isinstance(record, TestRecord) else record
+            for record in data]
 
-def get_all_tests(api_key=None, api_username=None):
+def _normalize_url(url):
     '''
-    Fetch all tests minimum data
-    Usefull for searching
-
-    :param api_key: Statuscacke API key.
-    :param api_username: Statuscake API username.
-
-    :return: dictionnary with res = True or False and data or error.
+    Normalize an url so that equivalent spellings share an index key
     '''
-    url = 'https://www.statuscake.com/API/Tests/'
-    method = 'GET'
+    if not url:
+        return ''
+    parts = _urlsplit(str(url).strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme, netloc.rpartition(':')[2]) in (('http', '80'), ('https', '443')):
+        netloc = netloc.rpartition(':')[0]
+    return _urlunsplit((scheme, netloc, parts.path.rstrip('/'), parts.query, ''))
+
+def _index_values(field, value):
+    if field == 'tag':
+        if not value:
+            return []
+        if not isinstance(value, (list, tuple)):
+            value = str(value).split(',')
+        return [tag.strip() for tag in value if tag and tag.strip()]
+    if field == 'url':
+        return [_normalize_url(value)]
+    return [value]
+
+def _index_add(kind, index, record):
+    definition = STATUSCAKE_INVENTORY_DEFINITION[kind]
+    index['id'][str(record.get(definition['id']))] = record
+    for field, source in definition['indexes'].items():
+        for value in _index_values(field, record.get(source)):
+            index[field].setdefault(value, []).append(record)
+
+def _index_remove(kind, index, record):
+    definition = STATUSCAKE_INVENTORY_DEFINITION[kind]
+    index['id'].pop(str(record.get(definition['id'])), None)
+    for field, source in definition['indexes'].items():
+        for value in _index_values(field, record.get(source)):
+            bucket = [r for r in index[field].get(value, []) if r is not record]
+            if bucket:
+                index[field][value] = bucket
+            else:
+                index[field].pop(value, None)
 
-    return _query(url=url,
-            method=method, username=api_username,
-            api_key=api_key, auth=True)
+def _build_index(kind, data):
+    '''
+    Index a listing by id and by every field of
+    STATUSCAKE_INVENTORY_DEFINITION[kind]['indexes'].
+    Values shared by several records, such as duplicated names, have one
+    bucket holding all of them.
+    '''
+    definition = STATUSCAKE_INVENTORY_DEFINITION[kind]
+    index = {'id': {}}
+    for field in definition['indexes']:
+        index[field] = {}
+    for record in data:
+        _index_add(kind, index, record)
+    return index
+
+def _snapshot_path(kind, account, suffix='json'):
+    digest = hashlib.sha1(str(account).encode('utf-8')).hexdigest()
+    return os.path.join(__opts__['cachedir'], 'statuscake',
+                        '{0}-{1}.{2}'.format(kind, digest, suffix))
+
+def _load_json(path):
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, 'r') as fp_:
+            return json.load(fp_)
+    except (IOError, OSError, ValueError) as exc:
+        log.debug('Ignoring statuscake snapshot %s: %s', path, exc)
+        return None
+
+def _dump_json(path, data):
+    '''
+    Atomically replace path with data
+    '''
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        fd_, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd_, 'w') as fp_:
+            json.dump(data, fp_)
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except (IOError, OSError) as exc:
+        log.debug('Unable to write statuscake snapshot %s: %s', path, exc)
+
+def _read_snapshot(kind, account, path=None):
+    '''
+    Load the on-disk listing of kind for account, None if unusable.
+    The time and validators stored by _touch_snapshot are merged in when
+    they belong to the same content.
+    '''
+    snapshot = _load_json(path or _snapshot_path(kind, account))
+    if not snapshot or snapshot.get('account') != account or 'data' not in snapshot:
+        return None
+    if path is None:
+        meta = _load_json(_snapshot_path(kind, account, 'meta.json'))
+        if meta and snapshot.get('hash') and meta.get('hash') == snapshot['hash']:
+            snapshot.update(meta)
+    return snapshot
+
+def _write_snapshot(kind, account, snapshot, path=None):
+    '''
+    Atomically replace the on-disk listing of kind for account
+    '''
+    snapshot['account'] = account
+    _dump_json(path or _snapshot_path(kind, account), snapshot)
+    if path is None and snapshot.get('hash'):
+        _touch_snapshot(kind, account, snapshot)
 
-def get_test(id, api_key=None, api_username=None):
+def _touch_snapshot(kind, account, snapshot):
     '''
-    Fetch specific test data
+    Store the time and validators of an unchanged snapshot, without
+    rewriting its listing
+    '''
+    _dump_json(_snapshot_path(kind, account, 'meta.json'),
+               dict((key, snapshot.get(key)) for key in
+                    ('account', 'hash', 'time', 'etag', 'last_modified')))
+
+def _drop_snapshot(kind, account):
+    for suffix in ('json', 'meta.json'):
+        try:
+            os.remove(_snapshot_path(kind, account, suffix))
+        except (IOError, OSError):
+            pass
+
+def _fingerprint_path(account, id):
+    digest = hashlib.sha1(str(account).encode('utf-8')).hexdigest()
+    shard = int(hashlib.sha1(str(id).encode('utf-8')).hexdigest()[:8], 16) % FINGERPRINT_SHARDS
+    return os.path.join(__opts__['cachedir'], 'statuscake', 'fingerprints', digest,
+                        '{0:02x}.json'.format(shard))
+
+def _read_fingerprints(path):
+    try:
+        with open(path, 'r') as fp_:
+            return json.load(fp_)
+    except (IOError, OSError, ValueError):
+        return {}
+
+def _hash_params(params):
+    return hashlib.sha256(
+        json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _desired_fingerprint(params):
+    params = dict((k, v) for k, v in params.items() if k != 'TestID' and v is not None)
+    return _hash_params(normalize_params('test', **params))
+
+def _listing_fingerprint(record):
+    return _hash_params(normalize_params('test', **dict(
+        (field, record.get(field)) for field in FINGERPRINT_FIELDS
+        if record.get(field) is not None)))
+
+def _get_fingerprint(account, id, profile=None):
+    '''
+    Return the fingerprint of test id, None when missing, too old or disabled
+    '''
+    if not _get_config('fingerprints', True, profile):
+        return None
+    fingerprint = _read_fingerprints(_fingerprint_path(account, id)).get(str(id))
+    if not fingerprint:
+        return None
+    max_age = int(_get_config('fingerprint_max_age', DEFAULT_FINGERPRINT_MAX_AGE, profile))
+    if max_age and time.time() - fingerprint.get('time', 0) > max_age:
+        return None
+    return fingerprint
+
+def _set_fingerprint(account, id, fingerprint, profile=None):
+    '''
+    Store, or drop when fingerprint is None, the fingerprint of test id.
+    The shard is rewritten under an exclusive lock, so concurrent jobs
+    never lose each other's entries.
+    '''
+    if not _get_config('fingerprints', True, profile):
+        return
+    path = _fingerprint_path(account, id)
+    lock = None
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if fcntl is not None:
+            lock = open(path + '.lock', 'a')
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        fingerprints = _read_fingerprints(path)
+        if fingerprint is None:
+            if fingerprints.pop(str(id), None) is None:
+                return
+        else:
+            fingerprint['time'] = time.time()
+            fingerprints[str(id)] = fingerprint
+        fd_, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        with os.fdopen(fd_, 'w') as fp_:
+            json.dump(fingerprints, fp_)
+        getattr(os, 'replace', os.rename)(tmp, path)
+    except (IOError, OSError) as exc:
+        log.debug('Unable to store statuscake fingerprint of %s: %s', id, exc)
+    finally:
+        if lock is not None:
+            lock.close()
+
+def _fingerprint_unchanged(account, id, params, record, profile=None):
+    '''
+    True when params and the listing record of test id hash like when the
+    test was last known to match
+    '''
+    if record is None:
+        return False
+    fingerprint = _get_fingerprint(account, id, profile)
+    unchanged = (fingerprint is not None
+                 and fingerprint.get('params') == _desired_fingerprint(params)
+                 and fingerprint.get('listing') == _listing_fingerprint(record))
+    if fingerprint is not None:
+        _record_cache('fingerprint', account, 'hit' if unchanged else 'miss')
+    return unchanged
+
+def _remember_test(account, id, params, record, profile=None):
+    if record is None:
+        return
+    _set_fingerprint(account, id, {'params': _desired_fingerprint(params),
+                                   'listing': _listing_fingerprint(record)}, profile)
+
+def _listed_test(id, api_key=None, api_username=None, profile=None):
+    inventory = _load_inventory('test', api_key, api_username, profile=profile)
+    if not inventory['res']:
+        return None
+    return inventory['entry']['index']['id'].get(str(id))
+
+def _get_header(headers, name):
+    for key, value in (headers or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+def _hash_listing(data):
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+def _lock_listing(kind, account, profile=None):
+    '''
+    Take the lock file of the listing of kind for account.
+    Return the open lock, None when it could not be taken, and whether
+    another process was holding it.
+    '''
+    path = _snapshot_path(kind, account, 'lock')
+    timeout = float(_get_config('coalesce_timeout', DEFAULT_COALESCE_TIMEOUT, profile))
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        lock = open(path, 'a')
+    except (IOError, OSError) as exc:
+        log.debug('Unable to open statuscake lock %s: %s', path, exc)
+        return None, False
+
+    waited = False
+    give_up = time.time() + timeout
+    while True:
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock, waited
+        except (IOError, OSError):
+            if time.time() >= give_up:
+                log.debug('Statuscake lock %s still held after %ss, fetching anyway',
+                          path, timeout)
+                lock.close()
+                return None, waited
+            waited = True
+            time.sleep(0.05)
+
+def _shared_listing(kind, account, use_snapshot, since):
+    '''
+    Return the listing of kind written by another process after since,
+    None if there is none
+    '''
+    # The snapshot meta is written on every fetch, even of an unchanged listing
+    if use_snapshot:
+        path = _snapshot_path(kind, account, 'meta.json')
+    else:
+        path = _snapshot_path(kind, account, 'shared.json')
+    try:
+        if os.path.getmtime(path) < since:
+            return None
+    except (IOError, OSError):
+        return None
+    if use_snapshot:
+        shared = _read_snapshot(kind, account)
+    else:
+        shared = _read_snapshot(kind, account, path)
+    return shared['data'] if shared else None
 
-    :param id: TestID. MANDATORY
-    :param api_key: Statuscacke API key.
-    :param api_username: Statuscake API username.
+def _fetch_listing(kind, account, api_key=None, api_username=None, refresh=False, profile=None):
+    '''
+    Fetch the listing of kind, going through the on-disk snapshot.
 
-    :return: dictionnary with res = True or False and data or error.
+    Only one process at a time fetches a listing, the processes which had
+    to wait for the lock reuse the listing it wrote if it is newer than
+    their own call.
     '''
-    url = 'https://www.statuscake.com/API/Tests/Details?TestID={0}'.format(id)
-    method = 'GET'
+    use_snapshot = _get_config('snapshot', True, profile)
+    if fcntl is None or not _get_config('coalesce', True, profile):
+        return _request_listing(kind, account, api_key, api_username, refresh,
+                                use_snapshot, False, profile)
+
+    started = time.time()
+    lock, waited = _lock_listing(kind, account, profile)
+    try:
+        if waited:
+            shared = _shared_listing(kind, account, use_snapshot, started)
+            if shared is not None:
+                _record_cache(kind, account, 'coalesced')
+                return {'message': '', 'res': True, 'data': shared}
+        return _request_listing(kind, account, api_key, api_username, refresh,
+                                use_snapshot, True, profile)
+    finally:
+        if lock is not None:
+            lock.close()
+
+def _request_listing(kind, account, api_key, api_username, refresh, use_snapshot,
+                     share, profile=None):
+    '''
+    A snapshot younger than snapshot_max_age is returned as is. Otherwise it
+    is revalidated with If-None-Match / If-Modified-Since, and when the API
+    ignores those the content hash avoids rewriting an unchanged snapshot.
+    Without snapshot, the listing is written to the shared file when share
+    is set.
+    '''
+    snapshot = _read_snapshot(kind, account) if use_snapshot else None
+    now = time.time()
+
+    if snapshot and not refresh:
+        max_age = int(_get_config('snapshot_max_age', DEFAULT_SNAPSHOT_MAX_AGE, profile))
+        if max_age and now - snapshot.get('time', 0) < max_age:
+            _record_cache(kind, account, 'snapshot')
+            return {'message': '', 'res': True, 'data': snapshot['data']}
+
+    header_dict = {}
+    if snapshot:
+        if snapshot.get('etag'):
+            header_dict['If-None-Match'] = snapshot['etag']
+        if snapshot.get('last_modified'):
+            header_dict['If-Modified-Since'] = snapshot['last_modified']
+
+    result = _query(url=STATUSCAKE_INVENTORY_DEFINITION[kind]['url'],
+            method='GET', username=api_username,
+            api_key=api_key, auth=True, profile=profile, header_dict=header_dict,
+            with_headers=bool(use_snapshot))
+
+    if result['res'] and share and not use_snapshot:
+        _write_snapshot(kind, account, {'data': result['data']},
+                        _snapshot_path(kind, account, 'shared.json'))
+    if not result['res'] or not use_snapshot:
+        return result
+
+    headers = result.pop('headers', {})
+    if result.get('not_modified') and snapshot:
+        _record_cache(kind, account, 'not_modified')
+        snapshot['time'] = now
+        _touch_snapshot(kind, account, snapshot)
+        return {'message': '', 'res': True, 'data': snapshot['data']}
+
+    if 'data' not in result:
+        return {'message': 'Statuscake returned no listing', 'res': False}
+
+    digest = _hash_listing(result['data'])
+    unchanged = snapshot and snapshot.get('hash') == digest
+    if not unchanged:
+        snapshot = {'hash': digest, 'data': result['data']}
+    snapshot['time'] = now
+    snapshot['etag'] = _get_header(headers, 'ETag')
+    snapshot['last_modified'] = _get_header(headers, 'Last-Modified')
+    if unchanged:
+        _touch_snapshot(kind, account, snapshot)
+    else:
+        _write_snapshot(kind, account, snapshot)
+    return result
 
-    return _query(url=url,
-            method=method, username=api_username,
-            api_key=api_key, auth=True)
+def _iter_json_array(chunks):
+    '''
+    Incrementally decode a JSON array from an iterable of byte chunks,
+    yielding its items as soon as they are complete.
+    '''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf = ''
+    started = False
+    for chunk in chunks:
+        buf += utf8.decode(chunk)
+        pos = 0
+        length = len(buf)
+        while True:
+            while pos < length and buf[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= length:
+                break
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError('Expected a JSON array')
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                # Incomplete item, wait for the next chunk
+                break
+            yield item
+            pos = end
+        buf = buf[pos:]
+    raise ValueError('Truncated JSON array')
+
+def _stream_listing(kind, api_key=None, api_username=None, profile=None):
+    '''
+    Fetch the listing of kind without holding it in memory. The request
+    goes through _send, so it is rate limited and retried like the others.
 
-def search_test(name, api_key=None, api_username=None):
+    :return: dictionnary with res = True and an iterator of records in data,
+             or res = False and an error. Without requests the listing is
+             fetched at once and iterated.
+    '''
+    url = STATUSCAKE_INVENTORY_DEFINITION[kind]['url']
+    if not HAS_REQUESTS or not _get_config('pool', True, profile):
+        result = _query(url=url, method='GET', username=api_username,
+                api_key=api_key, auth=True, profile=profile)
+        if result['res']:
+            result['data'] = iter(result['data'])
+        return result
+
+    test = _check_api_key(api_key, profile)
+    if not test['res']:
+        return test
+    api_key = test['data']
+    test = _check_api_username(api_username, profile)
+    if not test['res']:
+        return test
+    username = test['data']
+
+    result = _send(url, 'GET', header_dict={'API': api_key, 'Username': username},
+                   username=username, api_key=api_key, profile=profile, stream=True)
+    if 'response' not in result:
+        ret = _handle_get_result(result)
+        if ret['res']:
+            ret['data'] = iter(ret.get('data') or [])
+        return ret
+
+    response = result['response']
+    started = result['_started']
+    received = [0]
+    chunks = response.iter_content(chunk_size=65536)
+
+    # Errors come as a 200 {"ErrNo": ..., "Error": ...} object, not an array
+    first = b''
+    for chunk in chunks:
+        received[0] += len(chunk)
+        first += chunk
+        if first.strip():
+            break
+    if first.lstrip()[:1] == b'{':
+        for chunk in chunks:
+            received[0] += len(chunk)
+            first += chunk
+        response.close()
+        _record_call(username, url, 'GET', response.status_code,
+                     time.time() - started, received[0])
+        try:
+            answer = json.loads(first.decode('utf-8'))
+        except ValueError:
+            answer = None
+        if isinstance(answer, dict) and 'Error' in answer:
+            return {'res': False, 'message': answer['Error']}
+        return {'res': False, 'message': 'Statuscake returned an invalid answer: {0}'.format(
+            first[:200].decode('utf-8', 'replace'))}
+
+    def _records():
+        def _chunks():
+            yield first
+            for chunk in chunks:
+                received[0] += len(chunk)
+                yield chunk
+
+        try:
+            for record in _iter_json_array(_chunks()):
+                yield record
+        finally:
+            response.close()
+            _record_call(username, url, 'GET', response.status_code,
+                         time.time() - started, received[0])
+
+    return {'message': '', 'res': True, 'data': _records()}
+
+def _stream_matches(kind, field, value, api_key=None, api_username=None, profile=None):
+    '''
+    Scan a streamed listing for records whose indexed field matches value
+    '''
+    result = _stream_listing(kind, api_key, api_username, profile)
+    if not result['res']:
+        return result
+
+    source = STATUSCAKE_INVENTORY_DEFINITION[kind]['indexes'][field]
+    try:
+        found = [record for record in result['data']
+                 if value in _index_values(field, record.get(source))]
+    except ValueError as exc:
+        return {'res': False, 'message': 'Unable to decode listing: {0}'.format(exc)}
+    return {'message': '', 'res': True, 'data': found}
+
+def _mirror_bank(account):
+    return '{0}/{1}'.format(MIRROR_BANK, account)
+
+def _read_mirror(kind, account, profile=None):
+    '''
+    Return the mirrored listing of kind for account, None when there is no
+    mirror or it is older than mirror_max_age.
+    '''
+    source = _get_config('mirror', False, profile)
+    if not source:
+        return None
+    max_age = int(_get_config('mirror_max_age', DEFAULT_MIRROR_MAX_AGE, profile))
+    try:
+        if source == 'master':
+            mirror = __salt__['publish.runner']('statuscake.mirror',
+                                                arg=[kind, account, max_age])
+        else:
+            cache = salt.cache.factory(__opts__)
+            mirror = cache.fetch(_mirror_bank(account), '{0}.meta'.format(kind)) or {}
+            if not max_age or time.time() - mirror.get('checked', 0) <= max_age:
+                mirror = cache.fetch(_mirror_bank(account), kind)
+            else:
+                mirror = None
+    except Exception as exc:  # pylint: disable=broad-except
+        log.debug('Unable to read the statuscake mirror of %s: %s', kind, exc)
+        return None
+    if not isinstance(mirror, dict) or 'data' not in mirror:
+        _record_cache(kind, account, 'mirror_miss')
+        return None
+    return mirror['data']
+
+def _load_inventory(kind, api_key=None, api_username=None, refresh=False, profile=None):
+    '''
+    Return the listing of kind and its index, served from __context__
+    while it is younger than inventory_ttl. Otherwise the mirror is used
+    when configured, unless refresh is set, before the API.
+    '''
+    cache = _inventory_cache()
+    account = _get_account(api_username, profile)
+    key = (kind, account)
+    ttl = int(_get_config('inventory_ttl', DEFAULT_INVENTORY_TTL, profile))
+
+    entry = cache.get(key)
+    if entry and not refresh and ttl and time.time() - entry['time'] < ttl:
+        _record_cache(kind, account, 'hit')
+        return {'message': '', 'res': True, 'entry': entry}
+
+    _record_cache(kind, account, 'miss')
+
+    source = 'api'
+    mirrored = None if refresh else _read_mirror(kind, account, profile)
+    if mirrored is not None:
+        _record_cache(kind, account, 'mirror')
+        source = 'mirror'
+        result = {'message': '', 'res': True, 'data': mirrored}
+    else:
+        result = _fetch_listing(kind, account, api_key, api_username, refresh, profile=profile)
+
+    if not result['res']:
+        cache.pop(key, None)
+        return result
+
+    data = [_make_record(kind, record) for record in result['data']]
+    entry = {'time': time.time(),
+             'source': source,
+             'data': data,
+             'index': _build_index(kind, data)}
+    if ttl:
+        cache[key] = entry
+    return {'message': '', 'res': True, 'entry': entry}
+
+def _load_inventory_for(kind, wanted, api_key=None, api_username=None, profile=None):
+    '''
+    Return the listing of kind like _load_inventory, fetched again from the
+    API when it comes from the mirror and misses one of wanted, a dict of
+    index field to values. The mirror can predate them, planning writes on
+    it would create duplicates.
+    '''
+    inventory = _load_inventory(kind, api_key, api_username, profile=profile)
+    if not inventory['res'] or inventory['entry'].get('source') != 'mirror':
+        return inventory
+    index = inventory['entry']['index']
+    for field, values in wanted.items():
+        if any(value not in index[field] for value in values):
+            # Not mirrored yet, ask the API
+            return _load_inventory(kind, api_key, api_username, True, profile=profile)
+    return inventory
+
+def _get_inventory(kind, api_key=None, api_username=None, refresh=False, profile=None,
+                   records=False):
+    '''
+    Return the listing of kind as a regular result dictionnary,
+    records are turned back to dictionnaries unless records is True.
+    '''
+    result = _load_inventory(kind, api_key, api_username, refresh, profile=profile)
+    if not result['res']:
+        return result
+    data = result['entry']['data']
+    return {'message': '', 'res': True,
+            'data': list(data) if records else _record_dicts(data)}
+
+def _inventory_saved(kind, api_username, params, result, profile=None):
+    '''
+    Patch the cached listing of kind after a successful Update call,
+    params being renamed to the listing fields.
+    Unknown shapes just drop the cached copy.
+    The on-disk snapshot is always dropped.
+    '''
+    if result is not True and not result['res']:
+        return
+
+    fields = STATUSCAKE_INVENTORY_DEFINITION[kind].get('fields', {})
+    params = dict((fields.get(k, k), v) for k, v in params.items())
+    cache = _inventory_cache()
+    account = _get_account(api_username, profile)
+    key = (kind, account)
+    _drop_snapshot(kind, account)
+
+    with _INVENTORY_LOCK:
+        entry = cache.get(key)
+        if not entry:
+            return
+        if result is True:
+            cache.pop(key, None)
+            return
+
+        id_key = STATUSCAKE_INVENTORY_DEFINITION[kind]['id']
+        raw = result.get('raw') or {}
+        if params.get(id_key):
+            record = entry['index']['id'].get(str(params[id_key]))
+            if record is not None:
+                _index_remove(kind, entry['index'], record)
+                record.update(params)
+                _index_add(kind, entry['index'], record)
+                return
+        elif raw.get('InsertID'):
+            record = _make_record(kind, params)
+            record.update({id_key: raw['InsertID']})
+            entry['data'].append(record)
+            _index_add(kind, entry['index'], record)
+            return
+
+        cache.pop(key, None)
+
+def _inventory_deleted(kind, api_username, id, profile=None):
+    '''
+    Remove a record from the cached listing of kind
+    '''
+    account = _get_account(api_username, profile)
+    _drop_snapshot(kind, account)
+
+    with _INVENTORY_LOCK:
+        entry = _inventory_cache().get((kind, account))
+        if not entry:
+            return
+
+        record = entry['index']['id'].get(str(id))
+        if record is not None:
+            _index_remove(kind, entry['index'], record)
+            entry['data'] = [r for r in entry['data'] if r is not record]
+
+def _location_servercode(location):
+    return str(location.get('servercode') or '').upper()
+
+def _build_locations_index(data):
+    index = {'servercode': {}, 'region': {}, 'ip': {}}
+    for location in data:
+        index['servercode'][_location_servercode(location)] = location
+        index['region'].setdefault(str(location.get('region') or ''), []).append(location)
+        for field in ('ip', 'ipv6'):
+            if location.get(field):
+                index['ip'][location[field]] = location
+    return index
+
+def _load_locations(refresh=False, profile=None):
+    '''
+    Return the probe locations and their index. They are read from
+    __context__, then from the on-disk copy while it is younger than
+    locations_ttl, then from the API. A stale copy is used when the API
+    can not be reached.
+    '''
+    ttl = int(_get_config('locations_ttl', DEFAULT_LOCATIONS_TTL, profile))
+    entry = __context__.get('statuscake.locations')
+    if entry and not refresh and time.time() - entry['time'] < ttl:
+        return {'message': '', 'res': True, 'entry': entry}
+
+    snapshot = _read_snapshot('locations', LOCATIONS_ACCOUNT)
+    if snapshot and not refresh and time.time() - snapshot.get('time', 0) < ttl:
+        _record_cache('locations', LOCATIONS_ACCOUNT, 'snapshot')
+        data = snapshot['data']
+    else:
+        result = _query(url=LOCATIONS_URL, method='GET', auth=False, profile=profile)
+        if result['res'] and 'data' in result:
+            data = result['data']
+            if isinstance(data, dict):
+                data = [data[key] for key in sorted(data, key=str)]
+            _write_snapshot('locations', LOCATIONS_ACCOUNT,
+                            {'time': time.time(), 'data': data})
+        elif snapshot:
+            log.warning('Using statuscake locations from %s, unable to refresh them: %s',
+                        time.ctime(snapshot.get('time', 0)), result.get('message'))
+            data = snapshot['data']
+        else:
+            return result
+
+    entry = {'time': time.time(), 'data': data, 'index': _build_locations_index(data)}
+    __context__['statuscake.locations'] = entry
+    return {'message': '', 'res': True, 'entry': entry}
+
+@_entry_point
+def get_locations(refresh=False, profile=None):
+    '''
+    API locations endpoint, cached on disk for locations_ttl seconds
+
+    :param refresh: Ignore the cached locations and fetch them again.
+    :param profile: Config key holding options.
+
+    :return: dictionnary with res = True or False and the locations in
+             message and data, or error.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.get_locations
+    '''
+    result = _load_locations(refresh, profile=profile)
+    if not result['res']:
+        return {'message': result['message'], 'res': False}
+    data = list(result['entry']['data'])
+    return {'message': data, 'res': True, 'data': data}
+
+
+@_entry_point
+def find_locations(servercode=None, region=None, ip=None, refresh=False, profile=None):
+    '''
+    Find probe locations by server code, region or IP address
+
+    :param servercode: Server code, such as UK1.
+    :param region: Region, such as Europe.
+    :param ip: IPv4 or IPv6 address of the probe.
+    :param refresh: Ignore the cached locations and fetch them again.
+    :param profile: Config key holding options.
+
+    :return: dictionnary with res = True or False and the matching
+             locations in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.find_locations region=Europe
+    '''
+    result = _load_locations(refresh, profile=profile)
+    if not result['res']:
+        return result
+    entry = result['entry']
+    index = entry['index']
+
+    buckets = []
+    if servercode is not None:
+        found = index['servercode'].get(str(servercode).upper())
+        buckets.append([found] if found else [])
+    if region is not None:
+        buckets.append(index['region'].get(str(region), []))
+    if ip is not None:
+        found = index['ip'].get(str(ip))
+        buckets.append([found] if found else [])
+
+    if not buckets:
+        return {'message': '', 'res': True, 'data': list(entry['data'])}
+
+    buckets.sort(key=len)
+    data = buckets[0]
+    for bucket in buckets[1:]:
+        members = set(id(location) for location in bucket)
+        data = [location for location in data if id(location) in members]
+    return {'message': '', 'res': True, 'data': list(data)}
+
+
+@_entry_point
+def get_probe_ips(region=None, ipv6=True, refresh=False, profile=None):
+    '''
+    IP addresses of the probes, to allow them through firewalls
+
+    :param region: Only the probes of this region, or list of regions.
+    :param ipv6: Include IPv6 addresses.
+    :param refresh: Ignore the cached locations and fetch them again.
+    :param profile: Config key holding options.
+
+    :return: dictionnary with res = True or False and sorted addresses in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.get_probe_ips ipv6=False
+    '''
+    result = _load_locations(refresh, profile=profile)
+    if not result['res']:
+        return result
+    entry = result['entry']
+
+    if region is None:
+        locations = entry['data']
+    else:
+        regions = region if isinstance(region, (list, tuple)) else str(region).split(',')
+        locations = [location for name in regions
+                     for location in entry['index']['region'].get(name.strip(), [])]
+
+    fields = ('ip', 'ipv6') if ipv6 else ('ip',)
+    ips = set(location[field] for location in locations for field in fields
+              if location.get(field))
+    return {'message': '', 'res': True, 'data': sorted(ips)}
+
+
+def _check_node_locations(kwargs, profile=None):
+    '''
+    Check NodeLocations against the cached probe locations.
+    Values are not checked when the locations are not available.
+
+    :return: None, or a dictionnary with res = False and the error.
+    '''
+    value = kwargs.get('NodeLocations')
+    if value is None or value == '':
+        return None
+    if not isinstance(value, (list, tuple)):
+        value = str(value).split(',')
+    items = [str(item).strip() for item in value if str(item).strip()]
+
+    result = _load_locations(profile=profile)
+    if not result['res']:
+        log.debug('NodeLocations not checked: %s', result['message'])
+        return None
+    known = result['entry']['index']['servercode']
+    unknown = [item for item in items if item.upper() not in known]
+    if unknown:
+        return {'res': False, 'message': 'Unknown NodeLocations: {0}'.format(', '.join(unknown))}
+    return None
+
+
+def _resolve_contact_groups(obj, kwargs, api_key=None, api_username=None, profile=None):
+    '''
+    Replace the contact group names given in kwargs by their ContactID.
+    The contact groups listing is only loaded when a name is given, and is
+    then cached like the other listings.
+
+    :return: None, or a dictionnary with res = False and the error.
+    '''
+    field = STATUSCAKE_CONTACT_GROUP_FIELDS[obj]
+    value = kwargs.get(field)
+    if value is None or value == '':
+        return None
+    if not isinstance(value, (list, tuple)):
+        value = str(value).split(',')
+    items = [str(item).strip() for item in value if str(item).strip()]
+    if all(item.isdigit() for item in items):
+        return None
+
+    names = [item for item in items if not item.isdigit()]
+    inventory = _load_inventory_for('contact_group', {'name': names},
+                                    api_key, api_username, profile)
+    if not inventory['res']:
+        return inventory
+    index = inventory['entry']['index']['name']
+
+    ids = []
+    for item in items:
+        if item.isdigit():
+            ids.append(item)
+            continue
+        found = index.get(item, [])
+        if len(found) != 1:
+            return {'res': False, 'message': '{0} contact group named {1}'.format(
+                'No' if not found else 'Multiple', item)}
+        ids.append(str(found[0]['ContactID']))
+    kwargs[field] = ids
+    return None
+
+@_entry_point
+def add_test(WebsiteName, WebsiteURL, CheckRate=60, TestType='HTTP', api_key=None, api_username=None, profile=None, **kwargs):
+    '''
+    Add a statuscake test
+
+    :param WebsiteName: WebsiteName. MANDATORY
+    :param WebsiteURL: WebsiteURL. MANDATORY
+    :param CheckRate: CheckRate. MANDATORY default to 60
+    :param TestType: TestType. MANDATORY default to HTTP
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and message or error.
+    '''
+
+    if not kwargs:
+        kwargs = {}
+
+    kwargs['WebsiteName'] = WebsiteName
+    kwargs['WebsiteURL'] = WebsiteURL
+    kwargs['CheckRate'] = CheckRate
+    kwargs['TestType'] = TestType
+
+    error = (_resolve_contact_groups('test', kwargs, api_key, api_username, profile)
+             or _check_node_locations(kwargs, profile))
+    if error:
+        return error
+
+    test = build_args('test', **kwargs)
+    if not test['res']:
+        return test
+    params = test['data']
+
+    url = 'https://www.statuscake.com/API/Tests/Update'
+    method = 'PUT'
+
+    result = _query(url=url,
+            method=method, username=api_username,
+            api_key=api_key, auth=True, profile=profile, args=params)
+    _inventory_saved('test', api_username, params, result, profile=profile)
+    if result is not True and result['res']:
+        id = params.get('TestID') or (result.get('raw') or {}).get('InsertID')
+        if id:
+            account = _get_account(api_username, profile)
+            with _INVENTORY_LOCK:
+                record = _inventory_cache().get(('test', account), {}).get('index', {}).get('id', {}).get(str(id))
+            _remember_test(account, id, params, record, profile)
+    return result
+
+@_entry_point
+def get_all_tests(api_key=None, api_username=None, refresh=False, profile=None,
+                  records=False, deadline=True):
+    '''
+    Fetch all tests minimum data
+    Usefull for searching
+
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+    :param records: Return the cached TestRecord objects instead of
+                    dictionnaries, for callers in the same process.
+    :param deadline: Apply the deadline option, the beacon turns it off.
+
+    :return: dictionnary with res = True or False and data or error.
+    '''
+    if not deadline:
+        _without_deadline()
+    return _get_inventory('test', api_key, api_username, refresh, profile=profile,
+                          records=records)
+
+@_entry_point
+def get_test(id, api_key=None, api_username=None, profile=None):
+    '''
+    Fetch specific test data
+
+    :param id: TestID. MANDATORY
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and data or error.
+    '''
+    url = 'https://www.statuscake.com/API/Tests/Details?TestID={0}'.format(id)
+    method = 'GET'
+
+    return _query(url=url,
+            method=method, username=api_username,
+            api_key=api_key, auth=True, profile=profile)
+
+@_entry_point
+def diff_test(id, WebsiteName, WebsiteURL, CheckRate=60, TestType='HTTP',
+              api_key=None, api_username=None, profile=None, **kwargs):
+    '''
+    Compare a statuscake test with the desired parameters.
+    The details call is skipped when the fingerprint of the test matches.
+
+    :param id: TestID. MANDATORY
+    :param WebsiteName: WebsiteName. MANDATORY
+    :param WebsiteURL: WebsiteURL. MANDATORY
+    :param CheckRate: CheckRate. MANDATORY default to 60
+    :param TestType: TestType. MANDATORY default to HTTP
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and changed fields in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.diff_test 1234 Toto https://toto.com CheckRate=300
+    '''
+    kwargs['WebsiteName'] = WebsiteName
+    kwargs['WebsiteURL'] = WebsiteURL
+    kwargs['CheckRate'] = CheckRate
+    kwargs['TestType'] = TestType
+
+    error = _resolve_contact_groups('test', kwargs, api_key, api_username, profile)
+    if error:
+        return error
+
+    test = build_args('test', **kwargs)
+    if not test['res']:
+        return test
+    desired = test['data']
+    desired.pop('TestID', None)
+
+    account = _get_account(api_username, profile)
+    record = _listed_test(id, api_key, api_username, profile)
+    if _fingerprint_unchanged(account, id, desired, record, profile):
+        return {'message': '', 'res': True, 'data': {}}
+
+    current = get_test(id, api_key, api_username, profile=profile)
+    if not current['res']:
+        return current
+
+    changes = diff_params('test', current['data'], desired)
+    if not changes:
+        _remember_test(account, id, desired, record, profile)
+    return {'message': '', 'res': True, 'data': changes}
+
+@_entry_point
+def search_test(name=None, api_key=None, api_username=None, refresh=False, url=None,
+                profile=None, stream=False):
     '''
     Search for a test with either name or url.
 
-    :param name: WebsiteName. MANDATORY
+    :param name: WebsiteName.
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+    :param url: WebsiteURL, used when name is not given.
+    :param stream: Scan the listing while it is downloaded instead of
+                   loading and caching it.
 
     :return: dictionnary with res = True or False and id or error.
     '''
@@ -329,38 +2435,105 @@ def search_test(name, api_key=None, api_username=None):
         ret['message'] = 'You have to provide at least name or url parameters'
         return ret
 
-    test = get_all_tests(api_key, api_username)
-    if not test['res']:
-        return test
-
-    data = test['data']
-    result = None
-
-    for test in data:
-        if test['WebsiteName'] != name:
-            continue
-        if result:
-            ret['res'] = False
-            ret['message'] = 'We have multiple test with this name : {0}'.format(name)
-        else:
-            result = test
+    if name:
+        field, value, label = 'name', name, 'name'
+    else:
+        field, value, label = 'url', _normalize_url(url), 'url'
 
-    if not result:
+    if stream:
+        inventory = _stream_matches('test', field, value, api_key, api_username, profile)
+        if not inventory['res']:
+            return inventory
+        found = inventory['data']
+    else:
+        inventory = _load_inventory('test', api_key, api_username, refresh, profile=profile)
+        if not inventory['res']:
+            return inventory
+        found = inventory['entry']['index'][field].get(value)
+        if not found and inventory['entry'].get('source') == 'mirror':
+            # Not mirrored yet, ask the API
+            inventory = _load_inventory('test', api_key, api_username, True, profile=profile)
+            if not inventory['res']:
+                return inventory
+            found = inventory['entry']['index'][field].get(value)
+
+    if not found:
         ret['res'] = False
-        ret['message'] = 'No test found with this name : {0}'.format(name)
+        ret['message'] = 'No test found with this {0} : {1}'.format(label, name or url)
         return ret
 
-    ret['id'] = result['TestID']
+    if len(found) > 1:
+        ret['res'] = False
+        ret['message'] = 'We have multiple test with this {0} : {1}'.format(label, name or url)
+
+    ret['id'] = found[0]['TestID']
     return ret
 
 
-def delete_test(id, api_key=None, api_username=None):
+@_entry_point
+def find_tests(name=None, url=None, tag=None, id=None,
+               api_key=None, api_username=None, refresh=False, profile=None,
+               records=False):
+    '''
+    Find tests matching every given criteria, using the inventory index.
+
+    :param name: WebsiteName.
+    :param url: WebsiteURL, compared once normalized.
+    :param tag: TestTags entry, or a list of entries that must all match.
+    :param id: TestID.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+    :param records: Return TestRecord objects instead of dictionnaries.
+
+    :return: dictionnary with res = True or False and data or error.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.find_tests tag=production
+    '''
+    inventory = _load_inventory('test', api_key, api_username, refresh, profile=profile)
+    if not inventory['res']:
+        return inventory
+
+    index = inventory['entry']['index']
+    buckets = []
+    if id is not None:
+        record = index['id'].get(str(id))
+        buckets.append([record] if record is not None else [])
+    if name is not None:
+        buckets.append(index['name'].get(name, []))
+    if url is not None:
+        buckets.append(index['url'].get(_normalize_url(url), []))
+    if tag is not None:
+        for value in _index_values('tag', tag):
+            buckets.append(index['tag'].get(value, []))
+
+    if not buckets:
+        data = list(inventory['entry']['data'])
+    else:
+        buckets.sort(key=len)
+        data = buckets[0]
+        for bucket in buckets[1:]:
+            members = set(str(record['TestID']) for record in bucket)
+            data = [record for record in data if str(record['TestID']) in members]
+
+    return {'message': '', 'res': True,
+            'data': list(data) if records else _record_dicts(data)}
+
+
+@_entry_point
+def delete_test(id, api_key=None, api_username=None, profile=None):
     '''
     Delete a statuscake test
 
     :param id: TestID. MANDATORY
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
 
     :return: dictionnary with res = True or False and message or error.
     '''
@@ -368,44 +2541,48 @@ def delete_test(id, api_key=None, api_username=None):
     url = 'https://www.statuscake.com/API/Tests/Details/?TestID={0}'.format(id)
     method = 'DELETE'
 
-    return _query(url=url,
+    result = _query(url=url,
             method=method, username=api_username,
-            api_key=api_key, auth=True)
+            api_key=api_key, auth=True, profile=profile)
+    if result is True or result['res']:
+        _inventory_deleted('test', api_username, id, profile=profile)
+        _set_fingerprint(_get_account(api_username, profile), id, None, profile)
+    return result
 
 
-def get_all_ssls(api_key=None, api_username=None):
+@_entry_point
+def get_all_ssls(api_key=None, api_username=None, refresh=False, profile=None):
     '''
     Fetch all ssl tests minimum data
     Usefull for searching
 
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
 
     :return: dictionnary with res = True or False and data or error.
     '''
-    url = 'https://app.statuscake.com/API/SSL/'
-    method = 'GET'
-
-    return _query(url=url,
-            method=method, username=api_username,
-            api_key=api_key, auth=True)
+    return _get_inventory('ssl', api_key, api_username, refresh, profile=profile)
 
 
+@_entry_point
 def add_ssl(domain, checkrate=3600, contact_groups=None,
             alert_at='1,7,30', alert_expiry=True, alert_reminder=True, alert_broken=True,
-            api_key=None, api_username=None, **kwargs):
+            api_key=None, api_username=None, profile=None, **kwargs):
     '''
     Add a statuscake SSL test
 
     :param domain: URL to check, has to start with https://. MANDATORY
     :param checkrate: Checkrate in seconds. Accepted: [300, 600, 1800, 3600, 86400, 2073600]. MANDATORY
-    :param contact_groups: Contactgroup IDs, separated by a comma. Can be an empy string. MANDATORY
+    :param contact_groups: Contactgroup IDs or names, separated by a comma. Can be an empy string. MANDATORY
     :param alert_at: When you wish to receive reminders. Must be exactly 3 numeric values seperated by commas. MANDATORY
     :param alert_expiry: Set to true to enable expiration alerts. False to disable. MANDATORY
     :param alert_reminder: Set to true to enable reminder alerts. False to disable. Also see alert_at. MANDATORY
     :param alert_broken: Set to true to enable broken alerts. False to disable. MANDATORY
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
 
     :return: dictionnary with res = True or False and message or error.
     '''
@@ -421,6 +2598,10 @@ def add_ssl(domain, checkrate=3600, contact_groups=None,
     kwargs['alert_reminder'] = alert_reminder
     kwargs['alert_broken'] = alert_broken
 
+    error = _resolve_contact_groups('ssl', kwargs, api_key, api_username, profile)
+    if error:
+        return error
+
     test = build_args('ssl', **kwargs)
     if not test['res']:
         return test
@@ -429,39 +2610,52 @@ def add_ssl(domain, checkrate=3600, contact_groups=None,
     url = 'https://app.statuscake.com/API/SSL/Update'
     method = 'PUT'
 
-    return _query(url=url,
+    result = _query(url=url,
             method=method, username=api_username,
-            api_key=api_key, auth=True, args=params)
+            api_key=api_key, auth=True, profile=profile, args=params)
+    _inventory_saved('ssl', api_username, params, result, profile=profile)
+    return result
 
 
-def delete_ssl(id, api_key=None, api_username=None):
+@_entry_point
+def delete_ssl(id, api_key=None, api_username=None, profile=None):
     '''
     Delete a statuscake SSL
 
     :param id: TestID. MANDATORY
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
 
     :return: dictionnary with res = True or False and message or error.
     '''
 
-    url = 'https://app.statuscake.com/API/SSL/Update?id='.format(id)
+    url = 'https://app.statuscake.com/API/SSL/Update?id={0}'.format(id)
     method = 'DELETE'
 
-    return _query(url=url,
+    result = _query(url=url,
             method=method, username=api_username,
-            api_key=api_key, auth=True)
+            api_key=api_key, auth=True, profile=profile)
+    if result is True or result['res']:
+        _inventory_deleted('ssl', api_username, id, profile=profile)
+    return result
 
 
-def search_ssl(url, api_key=None, api_username=None):
+@_entry_point
+def search_ssl(url, api_key=None, api_username=None, refresh=False, profile=None,
+               stream=False):
     '''
     Search for a ssl test with url.
 
     :param url: domain. MANDATORY
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+    :param stream: Scan the listing while it is downloaded instead of
+                   loading and caching it.
 
-    :return: dictionnary with res = True or False and id or error.
+    :return: dictionnary with res = True or False and id and listing data or error.
     '''
 
     ret = {'message': '', 'res': True}
@@ -470,38 +2664,48 @@ def search_ssl(url, api_key=None, api_username=None):
         ret['message'] = 'You have to provide at least name or url parameters'
         return ret
 
-    test = get_all_ssls(api_key, api_username)
-    if not test['res']:
-        return test
-
-    data = test['data']
-    result = None
-
-    for test in data:
-        if test['domain'] != url:
-            continue
-        if result:
-            ret['res'] = False
-            ret['message'] = 'We have multiple ssl domains with this url : {0}'.format(url)
-        else:
-            result = test
-
-    if not result:
+    value = _normalize_url(url)
+    if stream:
+        inventory = _stream_matches('ssl', 'url', value, api_key, api_username, profile)
+        if not inventory['res']:
+            return inventory
+        found = inventory['data']
+    else:
+        inventory = _load_inventory('ssl', api_key, api_username, refresh, profile=profile)
+        if not inventory['res']:
+            return inventory
+        found = inventory['entry']['index']['url'].get(value)
+        if not found and inventory['entry'].get('source') == 'mirror':
+            # Not mirrored yet, ask the API
+            inventory = _load_inventory('ssl', api_key, api_username, True, profile=profile)
+            if not inventory['res']:
+                return inventory
+            found = inventory['entry']['index']['url'].get(value)
+
+    if not found:
         ret['res'] = False
         ret['message'] = 'No ssl test found with this url : {0}'.format(url)
         return ret
 
+    if len(found) > 1:
+        ret['res'] = False
+        ret['message'] = 'We have multiple ssl domains with this url : {0}'.format(url)
+
+    result = found[0]
     ret['id'] = result['id']
+    ret['data'] = result
     return ret
 
 
-def get_ssl(id, api_key=None, api_username=None):
+@_entry_point
+def get_ssl(id, api_key=None, api_username=None, profile=None):
     '''
     Fetch specific test data
 
     :param id: TestID. MANDATORY
     :param api_key: Statuscacke API key.
     :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
 
     :return: dictionnary with res = True or False and data or error.
     '''
@@ -510,4 +2714,1105 @@ def get_ssl(id, api_key=None, api_username=None):
 
     return _query(url=url,
             method=method, username=api_username,
-            api_key=api_key, auth=True)
+            api_key=api_key, auth=True, profile=profile)
+
+
+@_entry_point
+def diff_ssl(id, domain, checkrate=3600, contact_groups=None,
+             alert_at='1,7,30', alert_expiry=True, alert_reminder=True, alert_broken=True,
+             api_key=None, api_username=None, profile=None, **kwargs):
+    '''
+    Compare a statuscake SSL test with the desired parameters.
+    The cached listing is compared first, get_ssl is only called when the
+    listing differs.
+
+    :param id: SSL test id. MANDATORY
+    :param domain: URL to check, has to start with https://. MANDATORY
+    :param checkrate: Checkrate in seconds.
+    :param contact_groups: Contactgroup IDs or names, separated by a comma.
+    :param alert_at: When you wish to receive reminders.
+    :param alert_expiry: Set to true to enable expiration alerts.
+    :param alert_reminder: Set to true to enable reminder alerts.
+    :param alert_broken: Set to true to enable broken alerts.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and changed fields in data.
+    '''
+    kwargs['domain'] = domain
+    kwargs['checkrate'] = checkrate
+    kwargs['contact_groups'] = contact_groups
+    kwargs['alert_at'] = alert_at
+    kwargs['alert_expiry'] = alert_expiry
+    kwargs['alert_reminder'] = alert_reminder
+    kwargs['alert_broken'] = alert_broken
+
+    error = _resolve_contact_groups('ssl', kwargs, api_key, api_username, profile)
+    if error:
+        return error
+
+    test = build_args('ssl', **kwargs)
+    if not test['res']:
+        return test
+    desired = test['data']
+    desired.pop('id', None)
+
+    inventory = _load_inventory('ssl', api_key, api_username, profile=profile)
+    if inventory['res']:
+        listed = inventory['entry']['index']['id'].get(str(id))
+        if listed is not None and not diff_params('ssl', listed, desired):
+            return {'message': '', 'res': True, 'data': {}}
+
+    current = get_ssl(id, api_key, api_username, profile=profile)
+    if not current['res']:
+        return current
+    current = current['data']
+    if isinstance(current, list):
+        current = ([item for item in current if str(item.get('id')) == str(id)]
+                   or [{}])[0]
+
+    return {'message': '', 'res': True,
+            'data': diff_params('ssl', current, desired)}
+
+
+@_entry_point
+def get_contact_groups(api_key=None, api_username=None, refresh=False, profile=None):
+    '''
+    Fetch all contact groups
+
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+
+    :return: dictionnary with res = True or False and data or error.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.get_contact_groups
+    '''
+    return _get_inventory('contact_group', api_key, api_username, refresh, profile=profile)
+
+
+@_entry_point
+def search_contact_group(name, api_key=None, api_username=None, refresh=False, profile=None):
+    '''
+    Search for a contact group by GroupName.
+
+    :param name: GroupName. MANDATORY
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+    :param refresh: Ignore the cached listing and fetch it again.
+
+    :return: dictionnary with res = True or False and id and listing data or error.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.search_contact_group Ops
+    '''
+    ret = {'message': '', 'res': True}
+
+    inventory = _load_inventory('contact_group', api_key, api_username, refresh, profile=profile)
+    if not inventory['res']:
+        return inventory
+    found = inventory['entry']['index']['name'].get(name)
+    if not found and inventory['entry'].get('source') == 'mirror':
+        # Not mirrored yet, ask the API
+        inventory = _load_inventory('contact_group', api_key, api_username, True, profile=profile)
+        if not inventory['res']:
+            return inventory
+        found = inventory['entry']['index']['name'].get(name)
+
+    if not found:
+        ret['res'] = False
+        ret['message'] = 'No contact group found with this name : {0}'.format(name)
+        return ret
+
+    if len(found) > 1:
+        ret['res'] = False
+        ret['message'] = 'We have multiple contact groups with this name : {0}'.format(name)
+
+    ret['id'] = found[0]['ContactID']
+    ret['data'] = found[0]
+    return ret
+
+
+@_entry_point
+def add_contact_group(GroupName, api_key=None, api_username=None, profile=None, **kwargs):
+    '''
+    Add or update, with ContactID, a statuscake contact group
+
+    :param GroupName: GroupName. MANDATORY
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and message or error.
+    '''
+    kwargs['GroupName'] = GroupName
+
+    group = build_args('contact_group', **kwargs)
+    if not group['res']:
+        return group
+    params = group['data']
+
+    url = 'https://app.statuscake.com/API/ContactGroups/Update'
+    method = 'PUT'
+
+    result = _query(url=url,
+            method=method, username=api_username,
+            api_key=api_key, auth=True, profile=profile, args=params)
+    _inventory_saved('contact_group', api_username, params, result, profile=profile)
+    return result
+
+
+@_entry_point
+def diff_contact_group(id, GroupName, api_key=None, api_username=None, profile=None, **kwargs):
+    '''
+    Compare a statuscake contact group with the desired parameters, using
+    the cached listing which holds every field.
+
+    :param id: ContactID. MANDATORY
+    :param GroupName: GroupName. MANDATORY
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and changed fields in data.
+    '''
+    kwargs['GroupName'] = GroupName
+
+    group = build_args('contact_group', **kwargs)
+    if not group['res']:
+        return group
+    desired = group['data']
+    desired.pop('ContactID', None)
+
+    inventory = _load_inventory('contact_group', api_key, api_username, profile=profile)
+    if not inventory['res']:
+        return inventory
+    current = inventory['entry']['index']['id'].get(str(id))
+    if current is None:
+        return {'res': False, 'message': 'No contact group found with this id : {0}'.format(id)}
+
+    return {'message': '', 'res': True,
+            'data': diff_params('contact_group', current, desired)}
+
+
+@_entry_point
+def delete_contact_group(id, api_key=None, api_username=None, profile=None):
+    '''
+    Delete a statuscake contact group
+
+    :param id: ContactID. MANDATORY
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and message or error.
+    '''
+    url = 'https://app.statuscake.com/API/ContactGroups/Update?ContactID={0}'.format(id)
+    method = 'DELETE'
+
+    result = _query(url=url,
+            method=method, username=api_username,
+            api_key=api_key, auth=True, profile=profile)
+    if result is True or result['res']:
+        _inventory_deleted('contact_group', api_username, id, profile=profile)
+    return result
+
+
+def _run_concurrently(func, items, concurrency=None, profile=None):
+    '''
+    Call func on every item from a bounded thread pool.
+    Results are returned in input order.
+    '''
+    items = list(items)
+    if not items:
+        return []
+
+    if not concurrency:
+        concurrency = int(_get_config('concurrency', DEFAULT_CONCURRENCY, profile))
+    concurrency = max(1, min(int(concurrency), len(items)))
+
+    # Workers run in the call of the caller
+    call = _current_call()
+
+    def _in_job(item):
+        _CALL.call = call
+        try:
+            return func(item)
+        finally:
+            _CALL.call = None
+
+    # Loader dunders may live in context variables, give each call a copy
+    if contextvars is not None:
+        calls = [(contextvars.copy_context(), item) for item in items]
+        worker = lambda call: call[0].run(_in_job, call[1])
+    else:
+        calls = items
+        worker = _in_job
+
+    if concurrency == 1:
+        return [worker(call) for call in calls]
+
+    pool = ThreadPool(concurrency)
+    try:
+        return pool.map(worker, calls)
+    finally:
+        pool.close()
+        pool.join()
+
+def _bulk_result(results):
+    results = [{'res': True, 'message': ''} if result is True else result
+               for result in results]
+    failed = len([result for result in results if not result['res']])
+    ret = {'res': not failed, 'data': results}
+    ret['message'] = '{0} of {1} failed'.format(failed, len(results)) if failed else ''
+    return ret
+
+
+@_entry_point
+def apply_tests(tests, concurrency=None, api_key=None, api_username=None, profile=None):
+    '''
+    Create or update many statuscake tests concurrently.
+    Tests without TestID are matched by WebsiteName against the inventory.
+    The parameters are validated with build_args and sent as validated, so
+    missing ones get the defaults of STATUSCAKE_PARAMS_DEFINITION.
+
+    :param tests: List of test definitions, as accepted by add_test. MANDATORY
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and per test results in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.apply_tests '[{WebsiteName: a, WebsiteURL: "https://a.com"}]'
+    '''
+    names = [definition['WebsiteName'] for definition in tests
+             if definition.get('WebsiteName') and not definition.get('TestID')]
+    inventory = _load_inventory_for('test', {'name': names}, api_key, api_username, profile)
+    index = inventory['entry']['index'] if inventory['res'] else None
+
+    calls = []
+    for definition in tests:
+        checked = build_args('test', **definition)
+        if not checked['res']:
+            calls.append(checked)
+            continue
+        definition = checked['data']
+        if not definition.get('TestID') and index is not None:
+            found = index['name'].get(definition['WebsiteName'], [])
+            if len(found) == 1:
+                definition['TestID'] = found[0]['TestID']
+        definition['api_key'] = api_key
+        definition['api_username'] = api_username
+        definition['profile'] = profile
+        calls.append(definition)
+
+    def _apply(call):
+        if 'res' in call:
+            return call
+        return add_test(**call)
+
+    return _bulk_result(_run_concurrently(_apply, calls, concurrency, profile))
+
+
+@_entry_point
+def delete_tests(ids, concurrency=None, api_key=None, api_username=None, profile=None):
+    '''
+    Delete many statuscake tests concurrently
+
+    :param ids: List of TestID. MANDATORY
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and per test results in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.delete_tests '[1234, 5678]'
+    '''
+    return _bulk_result(_run_concurrently(
+        lambda id: delete_test(id, api_key, api_username, profile=profile), ids, concurrency,
+        profile))
+
+
+@_entry_point
+def get_tests(ids, concurrency=None, api_key=None, api_username=None, profile=None):
+    '''
+    Fetch many statuscake tests details concurrently
+
+    :param ids: List of TestID. MANDATORY
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and per test results in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.get_tests '[1234, 5678]'
+    '''
+    return _bulk_result(_run_concurrently(
+        lambda id: get_test(id, api_key, api_username, profile=profile), ids, concurrency,
+        profile))
+
+
+def _desired_tests(tests):
+    '''
+    Accept a list of definitions or a dict keyed by WebsiteName
+    '''
+    if isinstance(tests, dict):
+        desired = []
+        for name, definition in tests.items():
+            definition = dict(definition or {})
+            definition.setdefault('WebsiteName', name)
+            desired.append(definition)
+        return desired
+    return [dict(definition) for definition in tests or []]
+
+
+@_entry_point
+def plan_tests(tests, delete=False, managed_tag=None, concurrency=None,
+               api_key=None, api_username=None, profile=None):
+    '''
+    Compute the changes needed for the account to match a full set of tests.
+    The inventory is fetched once and tests are matched on WebsiteName,
+    details are only fetched for tests present on both sides whose
+    fingerprint does not match.
+
+    :param tests: List of test definitions, or dict of definitions keyed by WebsiteName. MANDATORY
+    :param delete: Also plan the deletion of tests absent from tests.
+    :param managed_tag: Tag added to every test of the set. When given, only tests with this tag are deleted.
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and create, update, delete
+             and unchanged lists in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.plan_tests "$(salt-call --out=json pillar.get statuscake:tests)" delete=True managed_tag=salt
+    '''
+    desired = {}
+    errors = []
+    for definition in _desired_tests(tests):
+        if managed_tag:
+            tags = _index_values('tag', definition.get('TestTags'))
+            if managed_tag not in tags:
+                tags.append(managed_tag)
+            definition['TestTags'] = tags
+        checked = (_resolve_contact_groups('test', definition, api_key, api_username, profile)
+                   or _check_node_locations(definition, profile))
+        if checked is None:
+            checked = build_args('test', **definition)
+        if not checked['res']:
+            errors.append('{0}: {1}'.format(definition.get('WebsiteName'), checked['message']))
+        elif definition['WebsiteName'] in desired:
+            errors.append('{0}: defined more than once'.format(definition['WebsiteName']))
+        else:
+            desired[definition['WebsiteName']] = checked['data']
+
+    inventory = _load_inventory_for('test', {'name': list(desired)},
+                                    api_key, api_username, profile)
+    if not inventory['res']:
+        return inventory
+    index = inventory['entry']['index']
+
+    plan = {'create': [], 'update': [], 'delete': [], 'unchanged': []}
+    existing = []
+    records = {}
+    for name, params in desired.items():
+        found = index['name'].get(name, [])
+        if not found:
+            plan['create'].append(dict(params))
+        elif len(found) > 1:
+            errors.append('{0}: we have multiple test with this name'.format(name))
+        else:
+            existing.append((name, found[0]['TestID']))
+            records[name] = found[0]
+
+    if delete:
+        for record in inventory['entry']['data']:
+            if record['WebsiteName'] in desired:
+                continue
+            if managed_tag and managed_tag not in _index_values('tag', record.get('TestTags')):
+                continue
+            plan['delete'].append({'TestID': record['TestID'],
+                                   'WebsiteName': record['WebsiteName']})
+
+    account = _get_account(api_username, profile)
+    checked = []
+    for name, tid in existing:
+        if _fingerprint_unchanged(account, tid, desired[name], records[name], profile):
+            plan['unchanged'].append(name)
+        else:
+            checked.append((name, tid))
+
+    details = get_tests([tid for name, tid in checked], concurrency,
+                        api_key, api_username, profile=profile)
+    for (name, tid), current in zip(checked, details['data']):
+        if not current['res']:
+            errors.append('{0}: {1}'.format(name, current['message']))
+            continue
+        params = dict(desired[name])
+        params.pop('TestID', None)
+        changes = diff_params('test', current['data'], params)
+        if changes:
+            params['TestID'] = tid
+            plan['update'].append({'TestID': tid, 'WebsiteName': name,
+                                   'changes': changes, 'definition': params})
+        else:
+            _remember_test(account, tid, params, records[name], profile)
+            plan['unchanged'].append(name)
+
+    ret = {'res': not errors, 'data': plan, 'message': '; '.join(errors)}
+    return ret
+
+
+@_entry_point
+def apply_plan(plan, concurrency=None, api_key=None, api_username=None, profile=None):
+    '''
+    Apply a plan computed by plan_tests, creates and updates first then deletes.
+
+    :param plan: Plan as returned in data by plan_tests. MANDATORY
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and per test results in data.
+    '''
+    definitions = list(plan.get('create', []))
+    definitions.extend(update['definition'] for update in plan.get('update', []))
+    ret = {'res': True, 'message': '', 'data': {'apply': [], 'delete': []}}
+
+    if definitions:
+        applied = apply_tests(definitions, concurrency, api_key, api_username, profile=profile)
+        ret['data']['apply'] = applied['data']
+        if not applied['res']:
+            ret['res'] = False
+            ret['message'] = 'apply: {0}'.format(applied['message'])
+
+    if plan.get('delete'):
+        deleted = delete_tests([test['TestID'] for test in plan['delete']],
+                               concurrency, api_key, api_username, profile=profile)
+        ret['data']['delete'] = deleted['data']
+        if not deleted['res']:
+            ret['res'] = False
+            ret['message'] = ' '.join([ret['message'], 'delete: {0}'.format(deleted['message'])]).strip()
+
+    return ret
+
+
+def _select_tests(tags=None, names=None, ids=None, api_key=None, api_username=None,
+                  profile=None):
+    '''
+    Records of the tests having one of tags, one of names or one of ids
+    '''
+    def _items(value):
+        if value is None:
+            return []
+        if isinstance(value, (list, tuple)):
+            return [str(item).strip() for item in value]
+        return [item.strip() for item in str(value).split(',')]
+
+    inventory = _load_inventory_for('test', {'name': _items(names), 'id': _items(ids)},
+                                    api_key, api_username, profile)
+    if not inventory['res']:
+        return inventory
+    index = inventory['entry']['index']
+
+    selected = {}
+    missing = []
+    for tag in _items(tags):
+        for record in index['tag'].get(tag, []):
+            selected[str(record['TestID'])] = record
+    for name in _items(names):
+        found = index['name'].get(name)
+        if not found:
+            missing.append(name)
+        for record in found or []:
+            selected[str(record['TestID'])] = record
+    for id in _items(ids):
+        record = index['id'].get(id)
+        if record is None:
+            missing.append(id)
+        else:
+            selected[id] = record
+
+    return {'message': '', 'res': True, 'data': list(selected.values()), 'missing': missing}
+
+def _set_paused(paused, tags=None, names=None, ids=None, concurrency=None,
+                api_key=None, api_username=None, profile=None):
+    '''
+    Update Paused on the selected tests which are not already in that state
+    '''
+    selected = _select_tests(tags, names, ids, api_key, api_username, profile)
+    if not selected['res']:
+        return selected
+
+    targets = []
+    skipped = []
+    for record in selected['data']:
+        if _normalize_value('bool', record.get('Paused')) == paused:
+            skipped.append(record['WebsiteName'])
+        else:
+            targets.append(record)
+
+    applied = apply_tests([{'TestID': record['TestID'],
+                            'WebsiteName': record['WebsiteName'],
+                            'WebsiteURL': record['WebsiteURL'],
+                            'CheckRate': record['CheckRate'],
+                            'TestType': record['TestType'],
+                            'Paused': paused} for record in targets],
+                          concurrency, api_key, api_username, profile=profile)
+
+    ret = {'message': '', 'res': True,
+           'data': {'changed': [], 'ids': [], 'skipped': skipped, 'failed': {}}}
+    for record, result in zip(targets, applied['data']):
+        if result['res']:
+            ret['data']['changed'].append(record['WebsiteName'])
+            ret['data']['ids'].append(record['TestID'])
+        else:
+            ret['data']['failed'][record['WebsiteName']] = result['message']
+
+    errors = []
+    if selected['missing']:
+        errors.append('No test found for {0}'.format(', '.join(selected['missing'])))
+    if ret['data']['failed']:
+        errors.append('Failed to update {0}'.format(', '.join(sorted(ret['data']['failed']))))
+    if errors:
+        ret['res'] = False
+        ret['message'] = '; '.join(errors)
+    return ret
+
+@_entry_point
+def pause(tags=None, names=None, ids=None, duration=None, concurrency=None,
+          api_key=None, api_username=None, profile=None):
+    '''
+    Pause every test having one of tags, or named in names, concurrently.
+    Tests already paused are left alone.
+
+    :param tags: TestTags entry, or a list of them.
+    :param names: WebsiteName, or a list of them.
+    :param ids: TestID, or a list of them.
+    :param duration: Seconds after which the tests paused by this call are
+                     resumed, through a one time entry of the minion schedule.
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and the changed, skipped
+             and failed tests in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.pause tags=production duration=900
+    '''
+    if tags is None and names is None and ids is None:
+        return {'res': False, 'message': 'You have to provide tags, names or ids'}
+
+    ret = _set_paused(True, tags, names, ids, concurrency, api_key, api_username, profile)
+    if 'data' not in ret or not duration or not ret['data']['ids']:
+        return ret
+
+    when = time.time() + float(duration)
+    schedule = 'statuscake-resume-{0}'.format(int(when * 1000))
+    added = __salt__['schedule.add'](
+        schedule,
+        function='statuscake.resume',
+        job_kwargs={'ids': ret['data']['ids'], 'concurrency': concurrency,
+                    'api_username': api_username, 'profile': profile,
+                    'schedule': schedule},
+        once=time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(when)),
+        once_fmt='%Y-%m-%dT%H:%M:%S')
+    if isinstance(added, dict) and added.get('result') is False:
+        ret['res'] = False
+        ret['message'] = '; '.join(filter(None, [
+            ret['message'],
+            'Unable to schedule the resume: {0}'.format(added.get('comment'))]))
+    else:
+        ret['data']['schedule'] = schedule
+    return ret
+
+@_entry_point
+def resume(tags=None, names=None, ids=None, concurrency=None, schedule=None,
+           api_key=None, api_username=None, profile=None):
+    '''
+    Resume every test having one of tags, or named in names, concurrently.
+    Tests which are not paused are left alone.
+
+    :param tags: TestTags entry, or a list of them.
+    :param names: WebsiteName, or a list of them.
+    :param ids: TestID, or a list of them.
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param schedule: Schedule entry to delete once done, set by pause.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and the changed, skipped
+             and failed tests in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.resume tags=production
+    '''
+    if tags is None and names is None and ids is None:
+        return {'res': False, 'message': 'You have to provide tags, names or ids'}
+
+    ret = _set_paused(False, tags, names, ids, concurrency, api_key, api_username, profile)
+    if schedule and ret['res']:
+        __salt__['schedule.delete'](schedule)
+    return ret
+
+
+def _check_time(value):
+    '''
+    Epoch seconds of a check time, given as a number or as a UTC
+    "YYYY-MM-DD HH:MM:SS" or ISO 8601 string, None if it can not be read
+    '''
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return float(calendar.timegm(time.strptime(value[:19], fmt)))
+        except ValueError:
+            continue
+    return None
+
+def _iter_check_pages(id, start, end, limit, api_key=None, api_username=None, profile=None):
+    '''
+    Walk the checks of a test from end back to start, one page of at most
+    limit checks per call
+    '''
+    url = 'https://app.statuscake.com/API/Tests/Checks'
+    while end > start:
+        query = _urlencode({'TestID': id, 'Start': int(start), 'End': int(end),
+                            'Limit': limit,
+                            'Fields': 'status,location,time,performance,statuscode'})
+        result = _query(url='{0}?{1}'.format(url, query), method='GET',
+                username=api_username, api_key=api_key, auth=True, profile=profile)
+        if not result['res']:
+            yield result
+            return
+        page = result.get('data') or []
+        if isinstance(page, dict):
+            page = list(page.values())
+        yield {'res': True, 'data': page}
+
+        if len(page) < limit:
+            return
+        times = [_check_time(check.get('Time', end)) for check in page]
+        times = [value for value in times if value is not None]
+        if not times or min(times) >= end:
+            return
+        oldest = min(times)
+        end = oldest - 1
+
+class _CheckColumns(object):
+    '''
+    Checks of one test stored column by column in typed arrays, locations
+    and status codes as small integers. Checks whose time or performance
+    can not be read are counted in skipped.
+    '''
+
+    def __init__(self):
+        self.time = array.array('d')
+        self.performance = array.array('d')
+        self.up = array.array('b')
+        self.location = array.array('i')
+        self.code = array.array('i')
+        self.locations = []
+        self.skipped = 0
+        self._location_ids = {}
+
+    def __len__(self):
+        return len(self.time)
+
+    def extend(self, page):
+        location_ids = self._location_ids
+        nan = float('nan')
+        for check in page:
+            checked = _check_time(check.get('Time', 0))
+            performance = check.get('Performance')
+            try:
+                performance = nan if performance in (None, '') else float(performance)
+            except (TypeError, ValueError):
+                checked = None
+            if checked is None:
+                self.skipped += 1
+                continue
+            location = check.get('Location') or ''
+            if location not in location_ids:
+                location_ids[location] = len(self.locations)
+                self.locations.append(location)
+            status = check.get('Status')
+            if isinstance(status, six.string_types):
+                status = status.lower() == 'up'
+            try:
+                code = int(check.get('StatusCode') or 0)
+            except (TypeError, ValueError):
+                code = 0
+            self.time.append(checked)
+            self.performance.append(performance)
+            self.up.append(1 if status else 0)
+            self.location.append(location_ids[location])
+            self.code.append(code)
+
+def _percentiles(values):
+    '''
+    Linear interpolated percentiles of a sorted list, as numpy computes them
+    '''
+    ret = {}
+    for pct in HISTORY_PERCENTILES:
+        key = 'p{0}'.format(pct)
+        if not values:
+            ret[key] = None
+            continue
+        rank = (len(values) - 1) * pct / 100.0
+        low = int(rank)
+        high = min(low + 1, len(values) - 1)
+        ret[key] = values[low] + (values[high] - values[low]) * (rank - low)
+    return ret
+
+def _summarize_numpy(columns):
+    performance = numpy.frombuffer(columns.performance, dtype=numpy.float64)
+    up = numpy.frombuffer(columns.up, dtype=numpy.int8)
+    location = numpy.frombuffer(columns.location, dtype=numpy.int32)
+    code = numpy.frombuffer(columns.code, dtype=numpy.int32)
+
+    def _stats(mask):
+        checks = int(mask.sum()) if mask is not None else len(up)
+        sample = performance if mask is None else performance[mask]
+        sample = sample[~numpy.isnan(sample)]
+        ups = up if mask is None else up[mask]
+        ret = {'checks': checks,
+               'uptime': float(ups.mean() * 100) if checks else None}
+        if len(sample):
+            for pct, value in zip(HISTORY_PERCENTILES,
+                                  numpy.percentile(sample, HISTORY_PERCENTILES)):
+                ret['p{0}'.format(pct)] = float(value)
+        else:
+            ret.update(_percentiles([]))
+        return ret
+
+    ret = _stats(None)
+    ret['locations'] = dict((name, _stats(location == idx))
+                            for idx, name in enumerate(columns.locations))
+    codes, counts = numpy.unique(code, return_counts=True)
+    ret['status_codes'] = dict((int(c), int(n)) for c, n in zip(codes, counts))
+    return ret
+
+def _summarize_python(columns):
+    by_location = [([], [0, 0]) for _ in columns.locations]
+    status_codes = {}
+    for performance, up, location, code in zip(columns.performance, columns.up,
+                                               columns.location, columns.code):
+        sample, counts = by_location[location]
+        if performance == performance:
+            sample.append(performance)
+        counts[0] += 1
+        counts[1] += up
+        status_codes[code] = status_codes.get(code, 0) + 1
+
+    def _stats(sample, counts):
+        ret = {'checks': counts[0],
+               'uptime': counts[1] * 100.0 / counts[0] if counts[0] else None}
+        ret.update(_percentiles(sorted(sample)))
+        return ret
+
+    overall = ([value for sample, _ in by_location for value in sample],
+               [sum(c[0] for _, c in by_location), sum(c[1] for _, c in by_location)])
+    ret = _stats(*overall)
+    ret['locations'] = dict((name, _stats(*by_location[idx]))
+                            for idx, name in enumerate(columns.locations))
+    ret['status_codes'] = status_codes
+    return ret
+
+def _history_window(days, start, end):
+    end = float(end) if end is not None else time.time()
+    start = float(start) if start is not None else end - float(days) * 86400
+    return start, end
+
+@_entry_point
+def get_checks(id, days=DEFAULT_HISTORY_DAYS, start=None, end=None, limit=DEFAULT_HISTORY_PAGE,
+               api_key=None, api_username=None, profile=None):
+    '''
+    Fetch the checks of a test, page by page
+
+    :param id: TestID. MANDATORY
+    :param days: Number of days before end to fetch, default to 30.
+    :param start: Start of the period as epoch seconds, instead of days.
+    :param end: End of the period as epoch seconds, default to now.
+    :param limit: Checks fetched per call.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and the checks, newest
+             first, in data or error.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.get_checks 1234 days=1
+    '''
+    start, end = _history_window(days, start, end)
+    checks = []
+    for page in _iter_check_pages(id, start, end, int(limit), api_key, api_username, profile):
+        if not page['res']:
+            return page
+        checks.extend(page['data'])
+    return {'message': '', 'res': True, 'data': checks}
+
+def _test_history(id, start, end, limit, api_key=None, api_username=None, profile=None):
+    columns = _CheckColumns()
+    for page in _iter_check_pages(id, start, end, limit, api_key, api_username, profile):
+        if not page['res']:
+            return page
+        columns.extend(page['data'])
+    if HAS_NUMPY and len(columns):
+        summary = _summarize_numpy(columns)
+    else:
+        summary = _summarize_python(columns)
+    summary['skipped'] = columns.skipped
+    return {'message': '', 'res': True, 'data': summary}
+
+@_entry_point
+def history_summary(ids=None, tag=None, days=DEFAULT_HISTORY_DAYS, start=None, end=None,
+                    limit=DEFAULT_HISTORY_PAGE, concurrency=None,
+                    api_key=None, api_username=None, profile=None):
+    '''
+    Aggregate the checks of many tests: number of checks, uptime percentage,
+    p50/p95/p99 response time, per location figures and status code counts.
+    Checks whose Time or Performance can not be read are left out and
+    counted in skipped.
+
+    Checks are kept in typed arrays while pages arrive and the figures are
+    computed with numpy when it is available. Tests are fetched concurrently.
+
+    :param ids: List of TestID.
+    :param tag: TestTags entry selecting the tests, instead of ids.
+    :param days: Number of days before end to aggregate, default to 30.
+    :param start: Start of the period as epoch seconds, instead of days.
+    :param end: End of the period as epoch seconds, default to now.
+    :param limit: Checks fetched per call.
+    :param concurrency: Maximum parallel calls, default to statuscake.concurrency or 10.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False and per TestID summaries
+             in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' statuscake.history_summary tag=production days=7
+    '''
+    if ids is None:
+        if tag is None:
+            return {'res': False, 'message': 'You have to provide ids or tag'}
+        found = find_tests(tag=tag, api_key=api_key, api_username=api_username,
+                           profile=profile, records=True)
+        if not found['res']:
+            return found
+        ids = [record['TestID'] for record in found['data']]
+    elif not isinstance(ids, (list, tuple)):
+        ids = [item for item in str(ids).split(',') if item]
+
+    start, end = _history_window(days, start, end)
+    results = _run_concurrently(
+        lambda id: _test_history(id, start, end, int(limit), api_key, api_username,
+                                 profile=profile),
+        ids, concurrency, profile)
+
+    ret = {'message': '', 'res': True, 'data': {}}
+    errors = []
+    for id, result in zip(ids, results):
+        if result['res']:
+            ret['data'][id] = result['data']
+        else:
+            errors.append('{0}: {1}'.format(id, result['message']))
+    if errors:
+        ret['res'] = False
+        ret['message'] = '; '.join(errors)
+    return ret
+
+
+@_entry_point
+def update_mirror(kinds=None, api_key=None, api_username=None, profile=None):
+    '''
+    Refresh the mirror of the listings read through the mirror option.
+    Listings are revalidated like the snapshot and only written to the
+    cache when their content changed. Run by the statuscake engine, without
+    deadline.
+
+    :param kinds: List of inventory kinds, default to all of them.
+    :param api_key: Statuscacke API key.
+    :param api_username: Statuscake API username.
+    :param profile: Config key holding username, api_key and options.
+
+    :return: dictionnary with res = True or False, and changed, unchanged
+             or the error per kind in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-call statuscake.update_mirror
+    '''
+    _without_deadline()
+    account = _get_account(api_username, profile)
+    if account is None:
+        return _check_api_username(api_username, profile)
+
+    ret = {'message': '', 'res': True, 'data': {}}
+    bank = _mirror_bank(account)
+    cache = salt.cache.factory(__opts__)
+    for kind in kinds or sorted(STATUSCAKE_INVENTORY_DEFINITION):
+        result = _fetch_listing(kind, account, api_key, api_username, True, profile=profile)
+        if not result['res']:
+            ret['res'] = False
+            ret['data'][kind] = result['message']
+            continue
+
+        meta_key = '{0}.meta'.format(kind)
+        digest = _hash_listing(result['data'])
+        try:
+            meta = cache.fetch(bank, meta_key) or {}
+            if meta.get('hash') == digest:
+                ret['data'][kind] = 'unchanged'
+            else:
+                cache.store(bank, kind, {'hash': digest, 'data': result['data']})
+                meta = {'hash': digest, 'updated': time.time()}
+                ret['data'][kind] = 'changed'
+            # The listing is only rewritten when it changed
+            meta['checked'] = time.time()
+            cache.store(bank, meta_key, meta)
+        except Exception as exc:  # pylint: disable=broad-except
+            ret['res'] = False
+            ret['data'][kind] = 'Unable to store the mirror: {0}'.format(exc)
+
+        with _INVENTORY_LOCK:
+            _inventory_cache().pop((kind, account), None)
+
+    if not ret['res']:
+        ret['message'] = 'Failed to mirror {0}'.format(', '.join(
+            kind for kind, state in sorted(ret['data'].items())
+            if state not in ('changed', 'unchanged')))
+    return ret
+
+
+def _stats_data(scope):
+    '''
+    Call and cache counters of scope as lists, with their totals.
+    Called with _STATS_LOCK held.
+    '''
+    calls = []
+    for (account, endpoint, method, status), counters in sorted(
+            scope['calls'].items(), key=lambda item: str(item[0])):
+        call = {'account': account, 'endpoint': endpoint,
+                'method': method, 'status': status}
+        call.update(counters)
+        calls.append(call)
+    cache = [{'kind': kind, 'account': account, 'outcome': outcome, 'count': count}
+             for (kind, account, outcome), count in sorted(scope['cache'].items())]
+    return {
+        'since': scope['since'],
+        'total_calls': sum(call['count'] for call in calls),
+        'total_seconds': sum(call['seconds'] for call in calls),
+        'calls': calls,
+        'cache': cache,
+    }
+
+def stats(reset=False, fire_event=False):
+    '''
+    Counters of the StatusCake calls made by this minion process: calls,
+    time, bytes received and decode time per account, endpoint, method and
+    status, plus retries, throttling, circuit breakers and inventory cache
+    outcomes.
+
+    Counters live in the process making the calls. A minion runs each job
+    in its own process, so ``salt '*' statuscake.stats`` only reports the
+    calls of the stats job itself: read them with ``salt-call`` on the
+    machine making the calls, or set statuscake.stats_event to True to get
+    the counters of each job that reached StatusCake as one
+    salt/statuscake/stats event, sent when the job ends.
+
+    :param reset: Clear the counters after reading them.
+    :param fire_event: Also send the summary as a salt/statuscake/stats event.
+
+    :return: dictionnary with res = True and counters in data.
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-call statuscake.stats
+    '''
+    with _STATS_LOCK:
+        data = _stats_data(_STATS)
+        if reset:
+            _STATS['calls'].clear()
+            _STATS['cache'].clear()
+            _STATS['since'] = time.time()
+
+    with _RATE_LIMITERS_LOCK:
+        throttle = dict((account, {'seconds': bucket.throttled,
+                                   'rate_limited': bucket.rate_limited,
+                                   'retries': bucket.retries,
+                                   'rate': bucket.rate})
+                        for account, bucket in _RATE_LIMITERS.items())
+
+    with _BREAKERS_LOCK:
+        breakers = dict((host, {'open': breaker.opened is not None,
+                                'failures': breaker.failures,
+                                'trips': breaker.trips,
+                                'rejected': breaker.rejected})
+                        for host, breaker in _BREAKERS.items())
+
+    data['throttle'] = throttle
+    data['breakers'] = breakers
+
+    if fire_event:
+        __salt__['event.send']('salt/statuscake/stats', data)
+
+    return {'message': '', 'res': True, 'data': data}
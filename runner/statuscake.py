@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+'''
+Reconcile Statuscake tests for the whole fleet from the master
+
+Minions declare the tests they need in their pillar, or publish them through
+the mine, and the master applies them with a single listing of the account
+and one concurrent, rate limited change plan, instead of every minion
+calling Statuscake with the same credentials.
+
+The runner uses the ``statuscake`` execution module, which has to be synced
+to the master with its credentials in the master config:
+
+.. code-block:: yaml
+
+    module_dirs:
+      - /srv/salt-statuscake/module
+    runner_dirs:
+      - /srv/salt-statuscake/runner
+
+    statuscake:
+      username: toto
+      api_key: peWcBiMOS9HrZG15peWcBiMOS9HrZG15
+      rate_limit: 5
+
+Tests are read from the ``statuscake:tests`` pillar key of every minion, a
+list of definitions or a dict keyed by WebsiteName, as for
+``statuscake_test.managed_set``. With ``source=mine`` the value returned by
+the ``statuscake_tests`` mine function is used as is, unless ``key`` points
+inside it:
+
+.. code-block:: yaml
+
+    statuscake:
+      tests:
+        www:
+          WebsiteURL: https://www.toto.com
+          CheckRate: 300
+          TestTags: production
+
+.. code-block:: bash
+
+    salt-run statuscake.reconcile test=True
+    salt-run statuscake.reconcile tgt='web*' delete=True managed_tag=salt
+
+``statuscake.mirror`` serves the listings kept by the ``statuscake`` engine
+to minions configured with ``mirror: master``, which needs:
+
+.. code-block:: yaml
+
+    peer_run:
+      .*:
+        - statuscake.mirror
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import json
+import logging
+import time
+
+# Import salt libs
+import salt.cache
+
+log = logging.getLogger(__name__)
+
+DEFAULT_KEY = 'statuscake:tests'
+DEFAULT_MINE_FUNCTION = 'statuscake_tests'
+MIRROR_BANK = 'statuscake/mirror'
+
+
+def _traverse(data, key):
+    for part in key.split(':') if key else []:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(part)
+    return data
+
+
+def _definitions(tests):
+    '''
+    Accept a list of definitions or a dict keyed by WebsiteName
+    '''
+    if isinstance(tests, dict):
+        for name, definition in tests.items():
+            definition = dict(definition or {})
+            definition.setdefault('WebsiteName', name)
+            yield definition
+    elif isinstance(tests, list):
+        for definition in tests:
+            if isinstance(definition, dict):
+                yield dict(definition)
+
+
+def _fingerprint(definition):
+    return json.dumps(dict((k, str(v) if not isinstance(v, (list, dict)) else v)
+                           for k, v in definition.items()),
+                      sort_keys=True, default=str)
+
+
+def _sources(tgt, tgt_type, source, key, mine_function):
+    '''
+    Definitions of every minion. The mine data is used as returned by
+    mine_function unless a key is given, the pillar is read at key or
+    DEFAULT_KEY.
+    '''
+    if source == 'mine':
+        data = __salt__['mine.get'](tgt, mine_function, tgt_type=tgt_type)
+        return dict((minion, _traverse(value, key) if key else value)
+                    for minion, value in (data or {}).items())
+    if source == 'pillar':
+        data = __salt__['cache.pillar'](tgt=tgt, tgt_type=tgt_type)
+        return dict((minion, _traverse(pillar, key or DEFAULT_KEY))
+                    for minion, pillar in (data or {}).items())
+    raise ValueError('Unknown source {0}, expected pillar or mine'.format(source))
+
+
+def collect(tgt='*', tgt_type='glob', source='pillar', key=None,
+            mine_function=DEFAULT_MINE_FUNCTION):
+    '''
+    Collect and deduplicate the tests declared by the targeted minions.
+
+    Definitions of the same WebsiteName are merged when they are identical.
+    Different definitions of the same WebsiteName are reported as conflicts
+    and left out.
+
+    tgt
+        Minions to collect from
+
+    tgt_type
+        Target type of tgt
+
+    source
+        ``pillar``, read from the pillar cache of the master, or ``mine``
+
+    key
+        Pillar key holding the definitions, default to ``statuscake:tests``,
+        or key inside the mine data, which is used whole by default
+
+    mine_function
+        Mine function publishing the definitions when source is mine
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run statuscake.collect tgt='web*'
+    '''
+    ret = {'res': True, 'message': '', 'data': {}, 'minions': {}, 'conflicts': {}}
+    try:
+        sources = _sources(tgt, tgt_type, source, key, mine_function)
+    except ValueError as exc:
+        ret['res'] = False
+        ret['message'] = str(exc)
+        return ret
+
+    fingerprints = {}
+    for minion in sorted(sources):
+        definitions = list(_definitions(sources[minion]))
+        if not definitions:
+            log.warning('No statuscake test collected from %s in its %s', minion, source)
+        for definition in definitions:
+            name = definition.get('WebsiteName')
+            if not name:
+                log.warning('Ignoring statuscake test without WebsiteName from %s', minion)
+                continue
+            fingerprint = _fingerprint(definition)
+            ret['minions'].setdefault(name, []).append(minion)
+            if name in ret['conflicts']:
+                ret['conflicts'][name].append(minion)
+            elif name not in fingerprints:
+                fingerprints[name] = fingerprint
+                ret['data'][name] = definition
+            elif fingerprints[name] != fingerprint:
+                ret['conflicts'][name] = list(ret['minions'][name])
+                del ret['data'][name]
+
+    if ret['conflicts']:
+        ret['message'] = 'Conflicting definitions for {0}'.format(
+            ', '.join(sorted(ret['conflicts'])))
+    return ret
+
+
+def reconcile(tgt='*', tgt_type='glob', source='pillar', key=None,
+              mine_function=DEFAULT_MINE_FUNCTION, delete=False, managed_tag=None,
+              concurrency=None, profile=None, test=False):
+    '''
+    Make the account hold the tests declared by the targeted minions.
+
+    The definitions are collected with ``statuscake.collect``, the inventory
+    is fetched once by ``statuscake.plan_tests`` on the master and the plan
+    is applied by ``statuscake.apply_plan``. Tests in conflict are neither
+    created, updated nor deleted.
+
+    delete
+        Delete the tests which are not declared by any minion
+
+    managed_tag
+        Tag added to every declared test, when given only tests with this
+        tag are deleted
+
+    concurrency
+        Maximum parallel calls to statuscake
+
+    profile
+        Config key holding the statuscake credentials to use
+
+    test
+        Only return the plan
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run statuscake.reconcile delete=True managed_tag=salt test=True
+    '''
+    ret = {'res': True, 'message': '', 'changes': {}}
+
+    collected = collect(tgt, tgt_type, source, key, mine_function)
+    if not collected['res']:
+        return collected
+    if delete and not collected['data']:
+        ret['res'] = False
+        ret['message'] = 'No statuscake test collected, not deleting anything'
+        return ret
+    if delete and collected['conflicts']:
+        ret['res'] = False
+        ret['message'] = '{0}, not deleting anything'.format(collected['message'])
+        ret['conflicts'] = collected['conflicts']
+        return ret
+
+    plan = __salt__['salt.cmd']('statuscake.plan_tests', collected['data'], delete,
+                                managed_tag, concurrency, profile=profile)
+    if not plan['res']:
+        ret['res'] = False
+        ret['message'] = 'Failed to plan statuscake tests: {0}'.format(plan['message'])
+        return ret
+
+    plan = plan['data']
+    ret['changes'] = {
+        'create': [item['WebsiteName'] for item in plan['create']],
+        'update': dict((item['WebsiteName'], item['changes']) for item in plan['update']),
+        'delete': [item['WebsiteName'] for item in plan['delete']],
+    }
+    ret['unchanged'] = len(plan['unchanged'])
+    if collected['conflicts']:
+        ret['res'] = False
+        ret['message'] = collected['message']
+        ret['conflicts'] = collected['conflicts']
+
+    if test or not (plan['create'] or plan['update'] or plan['delete']):
+        return ret
+
+    applied = __salt__['salt.cmd']('statuscake.apply_plan', plan, concurrency,
+                                   profile=profile)
+    if not applied['res']:
+        ret['res'] = False
+        ret['message'] = '; '.join(filter(None, [
+            ret['message'],
+            'Failed to change some statuscake tests: {0}'.format(applied['message'])]))
+        ret['errors'] = [result['message'] for result in
+                         applied['data']['apply'] + applied['data']['delete']
+                         if not result['res']]
+    return ret
+
+
+def mirror(kind, account, max_age=0):
+    '''
+    Return the listing of kind mirrored by the statuscake engine for account,
+    None when it is missing or not checked for max_age seconds.
+
+    kind
+        test, ssl or any kind mirrored by the engine
+
+    account
+        Statuscake username
+
+    max_age
+        Maximum age in seconds of the last check, 0 for any age
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt-run statuscake.mirror test toto
+    '''
+    cache = salt.cache.factory(__opts__)
+    bank = '{0}/{1}'.format(MIRROR_BANK, account)
+    meta = cache.fetch(bank, '{0}.meta'.format(kind)) or {}
+    if not meta or (max_age and time.time() - meta.get('checked', 0) > int(max_age)):
+        return None
+    listing = cache.fetch(bank, kind)
+    if not listing or listing.get('hash') != meta.get('hash'):
+        return None
+    return {'checked': meta['checked'], 'data': listing['data']}
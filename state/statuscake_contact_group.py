@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+'''
+Manage Statuscake contact groups
+
+
+Create, update and delete Statuscake contact groups
+
+Statuscake credentials need to be in minion grains
+
+.. code-block:: yaml
+    statuscake:
+      username: toto
+      api_key: peWcBiMOS9HrZG15peWcBiMOS9HrZG15
+
+Tests and SSL tests can then name their contact groups instead of using
+their IDs, names are resolved with one listing of the contact groups.
+
+.. code-block:: yaml
+
+    Ops:
+        statuscake_contact_group.present:
+          - Email: ops@toto.com,oncall@toto.com
+          - PingURL: https://hooks.toto.com/statuscake
+
+    Statuscake Web Test:
+        statuscake_test.present:
+          - WebsiteName: Toto
+          - WebsiteURL: https://test.toto.com
+          - ContactGroup: Ops
+          - require:
+            - statuscake_contact_group: Ops
+
+    Old team:
+        statuscake_contact_group.absent
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import logging
+
+log = logging.getLogger(__name__)
+
+def __virtual__():
+    '''
+    Only load if statuscake is available
+    '''
+    return 'statuscake_contact_group' if 'statuscake.search_contact_group' in __salt__ else False
+
+
+def present(
+        name,
+        GroupName=None,
+        Email=None,
+        Mobile=None,
+        PingURL=None,
+        DesktopAlert=None,
+        Boxcar=None,
+        Pushover=None,
+        profile=None):
+    '''
+    Ensure the contact group is present with the given parameters
+
+    name
+        GroupName when GroupName is not given
+
+    GroupName
+        Name of the contact group
+
+    Email
+        Email addresses, separated by a comma
+
+    Mobile
+        International mobile numbers, separated by a comma
+
+    PingURL
+        URL called on every alert
+
+    DesktopAlert
+        Enable desktop alerts
+
+    Boxcar
+        Boxcar API key
+
+    Pushover
+        Pushover account key
+
+    profile
+        Config key holding the statuscake credentials to use
+    '''
+    ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+    GroupName = GroupName or name
+
+    params = dict((k, v) for k, v in (
+        ('Email', Email), ('Mobile', Mobile), ('PingURL', PingURL),
+        ('DesktopAlert', DesktopAlert), ('Boxcar', Boxcar), ('Pushover', Pushover))
+        if v is not None)
+
+    listing = __salt__['statuscake.get_contact_groups'](profile=profile)
+    if not listing['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to list contact groups: {0}'.format(listing['message'])
+        return ret
+
+    group = __salt__['statuscake.search_contact_group'](GroupName, profile=profile)
+
+    if not group['res'] and 'id' not in group:
+        if __opts__['test']:
+            ret['comment'] = 'Statuscake contact group {0} set to be added.'.format(GroupName)
+            ret['result'] = None
+            return ret
+
+        added = __salt__['statuscake.add_contact_group'](GroupName, profile=profile, **params)
+
+        if added['res']:
+            ret['changes']['old'] = None
+            ret['changes']['new'] = GroupName
+            ret['comment'] = 'Added contact group {0}.'.format(GroupName)
+        else:
+            ret['result'] = False
+            ret['comment'] = 'Failed to add contact group {0}.'.format(GroupName)
+            ret['error'] = added['message']
+        return ret
+
+    if not group['res']:
+        ret['result'] = False
+        ret['comment'] = group['message']
+        return ret
+
+    cid = group['id']
+
+    diff = __salt__['statuscake.diff_contact_group'](cid, GroupName, profile=profile, **params)
+    if not diff['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to compare contact group {0}.'.format(GroupName)
+        ret['error'] = diff['message']
+        return ret
+
+    if not diff['data']:
+        ret['comment'] = 'Statuscake contact group {0} is up to date.'.format(GroupName)
+        return ret
+
+    changes = {
+        'old': dict((k, v['old']) for k, v in diff['data'].items()),
+        'new': dict((k, v['new']) for k, v in diff['data'].items()),
+    }
+
+    if __opts__['test']:
+        ret['comment'] = 'Statuscake contact group {0} set to be updated.'.format(GroupName)
+        ret['changes'] = changes
+        ret['result'] = None
+        return ret
+
+    params['ContactID'] = cid
+    updated = __salt__['statuscake.add_contact_group'](GroupName, profile=profile, **params)
+
+    if updated['res']:
+        ret['changes'] = changes
+        ret['comment'] = 'Updated contact group {0}.'.format(GroupName)
+    else:
+        ret['result'] = False
+        ret['comment'] = 'Failed to update contact group {0}.'.format(GroupName)
+        ret['error'] = updated['message']
+    return ret
+
+
+def absent(name, GroupName=None, profile=None):
+    '''
+    Ensure the contact group is deleted
+
+    name
+        GroupName when GroupName is not given
+
+    GroupName
+        Name of the contact group
+
+    profile
+        Config key holding the statuscake credentials to use
+    '''
+    ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+    GroupName = GroupName or name
+
+    listing = __salt__['statuscake.get_contact_groups'](profile=profile)
+    if not listing['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to list contact groups: {0}'.format(listing['message'])
+        return ret
+
+    group = __salt__['statuscake.search_contact_group'](GroupName, profile=profile)
+
+    if not group['res'] and 'id' not in group:
+        ret['comment'] = 'Statuscake contact group {0} does not exist.'.format(GroupName)
+        return ret
+
+    if not group['res']:
+        ret['result'] = False
+        ret['comment'] = group['message']
+        return ret
+
+    if __opts__['test']:
+        ret['comment'] = 'Statuscake contact group {0} set to be deleted.'.format(GroupName)
+        ret['result'] = None
+        return ret
+
+    deleted = __salt__['statuscake.delete_contact_group'](group['id'], profile=profile)
+
+    if deleted is True or deleted['res']:
+        ret['changes']['old'] = GroupName
+        ret['changes']['new'] = None
+        ret['comment'] = 'Deleted contact group {0}.'.format(GroupName)
+    else:
+        ret['result'] = False
+        ret['comment'] = 'Failed to delete contact group {0}.'.format(GroupName)
+        ret['error'] = deleted['message']
+    return ret
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+'''
+Manage Statuscake SSL tests
+
+
+Create, update and delete Statuscake SSL tests
+
+Statuscake credentials need to be in minion grains
+
+.. code-block:: yaml
+    statuscake:
+      username: toto
+      api_key: peWcBiMOS9HrZG15peWcBiMOS9HrZG15
+
+All SSL states of a run share one listing of the account, the details of a
+test are only fetched when its listing differs from the state.
+
+.. code-block:: yaml
+
+    https://test.toto.com:
+        statuscake_ssl.present:
+          - checkrate: 86400
+          - contact_groups: 1234
+          - alert_at: 7,14,30
+
+    https://old.toto.com:
+        statuscake_ssl.absent
+'''
+
+# Import Python libs
+from __future__ import absolute_import
+import logging
+
+log = logging.getLogger(__name__)
+
+def __virtual__():
+    '''
+    Only load if statuscake is available
+    '''
+    return 'statuscake_ssl' if 'statuscake.search_ssl' in __salt__ else False
+
+
+def present(
+        name,
+        domain=None,
+        checkrate=3600,
+        contact_groups=None,
+        alert_at='1,7,30',
+        alert_expiry=True,
+        alert_reminder=True,
+        alert_broken=True,
+        profile=None,
+        **kwargs):
+    '''
+    Ensure the SSL test is present with the given parameters
+
+    name
+        Domain to check when domain is not given
+
+    domain
+        URL to check, has to start with https://
+
+    checkrate
+        Checkrate in seconds, one of 300, 600, 1800, 3600, 86400, 2073600
+
+    contact_groups
+        Contactgroup IDs or names, separated by a comma
+
+    alert_at
+        When you wish to receive reminders, exactly 3 numeric values
+
+    alert_expiry
+        Enable expiration alerts
+
+    alert_reminder
+        Enable reminder alerts
+
+    alert_broken
+        Enable broken alerts
+
+    profile
+        Config key holding the statuscake credentials to use
+    '''
+    ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+    kwargs = dict((k, v) for k, v in kwargs.items() if not k.startswith('__'))
+    domain = domain or name
+
+    args = [domain, checkrate, contact_groups, alert_at,
+            alert_expiry, alert_reminder, alert_broken]
+
+    listing = __salt__['statuscake.get_all_ssls'](profile=profile)
+    if not listing['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to list SSL tests: {0}'.format(listing['message'])
+        return ret
+
+    test = __salt__['statuscake.search_ssl'](domain, profile=profile)
+
+    if not test['res'] and 'id' not in test:
+        if __opts__['test']:
+            ret['comment'] = 'Statuscake SSL test {0} set to be added.'.format(domain)
+            ret['result'] = None
+            return ret
+
+        added = __salt__['statuscake.add_ssl'](*args, profile=profile, **kwargs)
+
+        if added['res']:
+            ret['changes']['old'] = None
+            ret['changes']['new'] = domain
+            ret['comment'] = 'Added SSL test {0}.'.format(domain)
+        else:
+            ret['result'] = False
+            ret['comment'] = 'Failed to add SSL test {0}.'.format(domain)
+            ret['error'] = added['message']
+        return ret
+
+    if not test['res']:
+        ret['result'] = False
+        ret['comment'] = test['message']
+        return ret
+
+    sid = test['id']
+
+    diff = __salt__['statuscake.diff_ssl'](sid, *args, profile=profile, **kwargs)
+    if not diff['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to fetch SSL test {0}.'.format(domain)
+        ret['error'] = diff['message']
+        return ret
+
+    if not diff['data']:
+        ret['comment'] = 'Statuscake SSL test {0} is up to date.'.format(domain)
+        return ret
+
+    changes = {
+        'old': dict((k, v['old']) for k, v in diff['data'].items()),
+        'new': dict((k, v['new']) for k, v in diff['data'].items()),
+    }
+
+    if __opts__['test']:
+        ret['comment'] = 'Statuscake SSL test {0} set to be updated.'.format(domain)
+        ret['changes'] = changes
+        ret['result'] = None
+        return ret
+
+    kwargs['id'] = sid
+    updated = __salt__['statuscake.add_ssl'](*args, profile=profile, **kwargs)
+
+    if updated['res']:
+        ret['changes'] = changes
+        ret['comment'] = 'Updated SSL test {0}.'.format(domain)
+    else:
+        ret['result'] = False
+        ret['comment'] = 'Failed to update SSL test {0}.'.format(domain)
+        ret['error'] = updated['message']
+    return ret
+
+
+def absent(name, domain=None, profile=None):
+    '''
+    Ensure the SSL test is deleted
+
+    name
+        Domain to check when domain is not given
+
+    domain
+        URL of the SSL test
+
+    profile
+        Config key holding the statuscake credentials to use
+    '''
+    ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+    domain = domain or name
+
+    listing = __salt__['statuscake.get_all_ssls'](profile=profile)
+    if not listing['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to list SSL tests: {0}'.format(listing['message'])
+        return ret
+
+    test = __salt__['statuscake.search_ssl'](domain, profile=profile)
+
+    if not test['res'] and 'id' not in test:
+        ret['comment'] = 'Statuscake SSL test {0} does not exist.'.format(domain)
+        return ret
+
+    if not test['res']:
+        ret['result'] = False
+        ret['comment'] = test['message']
+        return ret
+
+    if __opts__['test']:
+        ret['comment'] = 'Statuscake SSL test {0} set to be deleted.'.format(domain)
+        ret['result'] = None
+        return ret
+
+    deleted = __salt__['statuscake.delete_ssl'](test['id'], profile=profile)
+
+    if deleted is True or deleted['res']:
+        ret['changes']['old'] = domain
+        ret['changes']['new'] = None
+        ret['comment'] = 'Deleted SSL test {0}.'.format(domain)
+    else:
+        ret['result'] = False
+        ret['comment'] = 'Failed to delete SSL test {0}.'.format(domain)
+        ret['error'] = deleted['message']
+    return ret
@@ -63,6 +63,7 @@ def present(
         WebsiteURL,
         CheckRate=60,
         TestType='HTTP',
+        profile=None,
         **kwargs):
     '''
     Ensure the webscenario is present with available steps
@@ -85,10 +86,27 @@ def present(
     steps
         List of steps to add to the scenario
 
+    profile
+        Config key holding the statuscake credentials to use
+
     '''
     ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+    kwargs = dict((k, v) for k, v in kwargs.items() if not k.startswith('__'))
 
-    test = __salt__['statuscake.search_test'](WebsiteName)
+    test = __salt__['statuscake.search_test'](WebsiteName, profile=profile)
+
+    if not test['res'] and 'id' not in test:
+        # Tell a missing test from an API failure, the listing is cached
+        listing = __salt__['statuscake.get_all_tests'](profile=profile, records=True)
+        if not listing['res']:
+            ret['result'] = False
+            ret['comment'] = 'Failed to list tests: {0}'.format(listing['message'])
+            return ret
+
+    if not test['res'] and 'id' in test:
+        ret['result'] = False
+        ret['comment'] = test['message']
+        return ret
 
     if not test['res']:
         if __opts__['test']:
@@ -97,7 +115,7 @@ def present(
             return ret
 
         added = __salt__['statuscake.add_test'](WebsiteName, WebsiteURL,
-                CheckRate, TestType, **kwargs)
+                CheckRate, TestType, profile=profile, **kwargs)
 
         if added['res']:
             ret['changes']['old'] = None
@@ -112,19 +130,125 @@ def present(
     else:
         tid = test['id']
 
-        kwargs['TestID'] = tid
+        diff = __salt__['statuscake.diff_test'](tid, WebsiteName, WebsiteURL,
+                CheckRate, TestType, profile=profile, **kwargs)
+        if not diff['res']:
+            ret['result'] = False
+            ret['comment'] = 'Failed to fetch test {0}.'.format(WebsiteName)
+            ret['error'] = diff['message']
+            return ret
+
+        if not diff['data']:
+            ret['comment'] = 'Statuscake test {0} is up to date.'.format(WebsiteName)
+            return ret
+
+        changes = {
+            'old': dict((k, v['old']) for k, v in diff['data'].items()),
+            'new': dict((k, v['new']) for k, v in diff['data'].items()),
+        }
 
         if __opts__['test']:
             msg = 'Statuscake tests {0} set to be updated.'.format(WebsiteName)
             ret['comment'] = msg
+            ret['changes'] = changes
             ret['result'] = None
             return ret
 
-        ret['result'] = True
-        ret['comment'] = 'Not updating because will cannot check data'
+        kwargs['TestID'] = tid
+        updated = __salt__['statuscake.add_test'](WebsiteName, WebsiteURL,
+                CheckRate, TestType, profile=profile, **kwargs)
+
+        if updated['res']:
+            ret['changes'] = changes
+            ret['comment'] = 'Updated test {0}.'.format(WebsiteName)
+        else:
+            ret['result'] = False
+            ret['comment'] = 'Failed to update test {0}.'.format(WebsiteName)
+            ret['error'] = updated['message']
         return ret
 
 
+def managed_set(
+        name,
+        tests,
+        delete=False,
+        managed_tag=None,
+        concurrency=None,
+        profile=None):
+    '''
+    Ensure the account holds exactly the given set of tests.
+    The inventory is fetched once, then creations, updates and deletions are
+    applied concurrently.
+
+    name
+        Name of the state
+
+    tests
+        List of test definitions, or dict of definitions keyed by WebsiteName
+
+    delete
+        Delete the tests which are not in tests
+
+    managed_tag
+        Tag added to every test of the set, when given only tests with this
+        tag are deleted
+
+    concurrency
+        Maximum parallel calls to statuscake
+
+    profile
+        Config key holding the statuscake credentials to use
+
+    .. code-block:: yaml
+
+        Statuscake tests:
+          statuscake_test.managed_set:
+            - tests: {{ salt['pillar.get']('statuscake:tests', {}) | json }}
+            - delete: True
+            - managed_tag: salt
+    '''
+    ret = {'name': name, 'result': True, 'comment': '', 'changes': {}}
+
+    plan = __salt__['statuscake.plan_tests'](tests, delete, managed_tag,
+            concurrency, profile=profile)
+    if not plan['res']:
+        ret['result'] = False
+        ret['comment'] = 'Failed to plan statuscake tests: {0}'.format(plan['message'])
+        return ret
+
+    plan = plan['data']
+    summary = {
+        'create': [test['WebsiteName'] for test in plan['create']],
+        'update': dict((test['WebsiteName'], test['changes']) for test in plan['update']),
+        'delete': [test['WebsiteName'] for test in plan['delete']],
+    }
+    counts = 'create {0}, update {1}, delete {2}, unchanged {3}'.format(
+        len(plan['create']), len(plan['update']), len(plan['delete']),
+        len(plan['unchanged']))
+
+    if not plan['create'] and not plan['update'] and not plan['delete']:
+        ret['comment'] = 'Statuscake tests are up to date ({0} tests).'.format(len(plan['unchanged']))
+        return ret
+
+    if __opts__['test']:
+        ret['comment'] = 'Statuscake tests set to be changed: {0}.'.format(counts)
+        ret['changes'] = summary
+        ret['result'] = None
+        return ret
+
+    applied = __salt__['statuscake.apply_plan'](plan, concurrency, profile=profile)
+    ret['changes'] = summary
+    if applied['res']:
+        ret['comment'] = 'Statuscake tests changed: {0}.'.format(counts)
+    else:
+        ret['result'] = False
+        ret['comment'] = 'Failed to change some statuscake tests: {0}'.format(applied['message'])
+        ret['error'] = [result['message'] for result in
+                        applied['data']['apply'] + applied['data']['delete']
+                        if not result['res']]
+    return ret
+
+
 def toto():
     if None:
         added = __salt__['boto_route53.add_record'](name, value, zone,